@@ -0,0 +1,231 @@
+"""
+AcroForm that shares widget appearance streams between fields that look the same.
+
+reportlab registers a new font resource object for every field it creates,
+so appearance streams of otherwise identical fields differ by the font reference
+in their resources and each widget ends up with its own XObject.
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase.acroform import AcroForm, PDFFromString
+from reportlab.pdfbase.pdfdoc import (
+    PDFArray,
+    PDFDictionary,
+    PDFName,
+    PDFStream,
+    PDFStreamFilterZCompress,
+    PDFString,
+)
+
+from core.fonts import FontMetrics, true_type_font_resource_name
+
+# Runs of glyphs with the same width longer than this are written as ranges in /W
+_WIDTHS_RUN_MIN = 4
+
+
+def _cid_widths(glyph_widths: List[float]) -> PDFArray:
+    """Build /W array of CID font. CIDs are equal to glyph indexes (/CIDToGIDMap /Identity)."""
+    widths: List[Any] = []
+    group: List[float] = []
+    group_start = 0
+
+    glyph = 0
+    while glyph < len(glyph_widths):
+        run_end = glyph
+        while (
+            run_end + 1 < len(glyph_widths)
+            and glyph_widths[run_end + 1] == glyph_widths[glyph]
+        ):
+            run_end += 1
+
+        if run_end - glyph + 1 < _WIDTHS_RUN_MIN:
+            if not group:
+                group_start = glyph
+            group += glyph_widths[glyph : run_end + 1]
+        else:
+            if group:
+                widths += [group_start, PDFArray(group)]
+                group = []
+            widths += [glyph, run_end, glyph_widths[glyph]]
+
+        glyph = run_end + 1
+
+    if group:
+        widths += [group_start, PDFArray(group)]
+
+    return PDFArray(widths)
+
+
+def _to_unicode_cmap(char_to_glyph: Dict[int, int]) -> str:
+    glyph_to_char: Dict[int, int] = {}
+    for char, glyph in sorted(char_to_glyph.items()):
+        glyph_to_char.setdefault(glyph, char)
+
+    mapping = sorted(glyph_to_char.items())
+    chunks = []
+    # bfchar sections are limited to 100 entries each
+    for i in range(0, len(mapping), 100):
+        chunk = mapping[i : i + 100]
+        lines = [
+            "<%04X> <%s>" % (glyph, chr(char).encode("utf-16-be").hex().upper())
+            for glyph, char in chunk
+        ]
+        chunks.append(
+            "%d beginbfchar\n%s\nendbfchar" % (len(chunk), "\n".join(lines))
+        )
+
+    return "\n".join(
+        [
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+            *chunks,
+            "endcmap",
+            "CMapName currentdict /CMap defineresource pop",
+            "end",
+            "end",
+        ]
+    )
+
+
+class SharedAppearanceForm(AcroForm):
+    def __init__(self, canv: canvas.Canvas, **kwds):
+        super(SharedAppearanceForm, self).__init__(canv, **kwds)
+        self._font_refs: Dict[str, Tuple[str, str]] = {}
+        self._true_type_fonts: Dict[str, FontMetrics] = {}
+        self._appearances: Dict[Tuple, Any] = {}
+
+    @staticmethod
+    def attach(c: canvas.Canvas) -> "SharedAppearanceForm":
+        """Replace the canvas' form with a new SharedAppearanceForm.
+
+        Must be called before any field is added to the canvas.
+        """
+        form = SharedAppearanceForm(c)
+        c._doc._catalog.AcroForm = c.AcroForm = form
+        return form
+
+    def format(self, doc):
+        # AcroForm puts a separate '/Font' key into /DR for each font,
+        # making broken dictionary when form fields use more than one font.
+        d = dict(Fields=PDFArray([self.getRef(f) for f in self.fields]))
+        if self.sigFlags:
+            d["SigFlags"] = self.sigFlags
+        if self.fonts:
+            font_keys = list(sorted(self.fonts.keys()))
+            fonts = " ".join(f"/{f} {self.fonts[f]}" for f in font_keys)
+            d["DA"] = PDFString(f"/{font_keys[0]} 0 Tf 0 g")
+            d["DR"] = PDFFromString(
+                f"<< /Encoding\n<<\n/RLAFencoding\n{self.encRefStr}\n>>\n"
+                f"/Font << {fonts} >>\n>>"
+            )
+        d.update(self.extras)
+        return PDFDictionary(d).format(doc)
+
+    def add_font(self, font_name: str, metrics: FontMetrics) -> None:
+        """Make TrueType font available for fields under the given name."""
+        self._true_type_fonts[font_name] = metrics
+
+    def _make_true_type_font(self, font_name: str) -> Tuple[str, str]:
+        # Font program is embedded as a whole: field values are not known
+        # at this point and viewers need glyphs for any text typed into the field.
+        # Fonts are added as Type0 with Identity-H encoding to support any script.
+        metrics = self._true_type_fonts[font_name]
+        filters = [PDFStreamFilterZCompress()] if self.canv._doc.compression else None
+        base_font = PDFName(metrics.name)
+
+        font_file = PDFStream(
+            PDFDictionary(dict(Length1=len(metrics.font_file))),
+            metrics.font_file,
+            filters=filters,
+        )
+        descriptor = PDFDictionary(
+            dict(
+                Type=PDFName("FontDescriptor"),
+                FontName=base_font,
+                Flags=metrics.flags,
+                FontBBox=PDFArray(metrics.bbox),
+                ItalicAngle=metrics.italic_angle,
+                Ascent=metrics.ascent,
+                Descent=metrics.descent,
+                CapHeight=metrics.cap_height,
+                StemV=metrics.stem_v,
+                FontFile2=self.getRef(font_file),
+            )
+        )
+        cid_font = PDFDictionary(
+            dict(
+                Type=PDFName("Font"),
+                Subtype=PDFName("CIDFontType2"),
+                BaseFont=base_font,
+                CIDSystemInfo=PDFDictionary(
+                    dict(
+                        Registry=PDFString("Adobe"),
+                        Ordering=PDFString("Identity"),
+                        Supplement=0,
+                    )
+                ),
+                FontDescriptor=self.getRef(descriptor),
+                DW=metrics.default_width,
+                W=_cid_widths(metrics.glyph_widths),
+                CIDToGIDMap=PDFName("Identity"),
+            )
+        )
+        to_unicode = PDFStream(
+            PDFDictionary(), _to_unicode_cmap(metrics.char_to_glyph), filters=filters
+        )
+        font = PDFDictionary(
+            dict(
+                Type=PDFName("Font"),
+                Subtype=PDFName("Type0"),
+                BaseFont=base_font,
+                Encoding=PDFName("Identity-H"),
+                DescendantFonts=PDFArray([self.getRef(cid_font)]),
+                ToUnicode=self.getRef(to_unicode),
+            )
+        )
+
+        ref = self.getRefStr(font)
+        internal_name = true_type_font_resource_name(font_name)
+        self.fonts[internal_name] = ref
+        return ref, internal_name
+
+    def makeFont(self, fontName):
+        if fontName not in self._font_refs:
+            if fontName in self._true_type_fonts:
+                self._font_refs[fontName] = self._make_true_type_font(fontName)
+            else:
+                self._font_refs[fontName] = super(
+                    SharedAppearanceForm, self
+                ).makeFont(fontName)
+
+        return self._font_refs[fontName]
+
+    def _shared_appearance(self, kind: str, build: Callable, args, kwds):
+        # Appearance is fully defined by the arguments it is built from,
+        # so they are used as the key: colors, sizes, border, font and value.
+        key = (kind, repr(args), repr(sorted(kwds.items())))
+        appearance = self._appearances.get(key)
+        if appearance is None:
+            appearance = build(*args, **kwds)
+            self._appearances[key] = appearance
+
+        return appearance
+
+    def txAP(self, *args, **kwds):
+        return self._shared_appearance(
+            "text", super(SharedAppearanceForm, self).txAP, args, kwds
+        )
+
+    def checkboxAP(self, *args, **kwds):
+        return self._shared_appearance(
+            "checkbox", super(SharedAppearanceForm, self).checkboxAP, args, kwds
+        )
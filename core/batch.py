@@ -0,0 +1,561 @@
+"""
+Run large batches of fill and attach jobs.
+
+Each job is run in a worker process under wall-time and memory budgets:
+a damaged or huge input can hang or exhaust its worker, but not the whole run.
+Workers over the time budget are killed, memory is limited with RLIMIT_AS
+and workers are recycled after a number of jobs to release memory kept by
+fragmented heap and caches.
+
+Progress is recorded in a state file, so an interrupted run started again
+skips finished jobs. Failed jobs are put into the error report.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from collections import deque, OrderedDict
+from dataclasses import dataclass, field
+
+import hashlib
+import io
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import tempfile
+import time
+
+import yaml
+
+OPERATION_FILL = "fill"
+OPERATION_ATTACH = "attach"
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Kinds of job failures
+FAILURE_TIMEOUT = "timeout"
+FAILURE_MEMORY = "memory"
+FAILURE_CRASHED = "crashed"
+FAILURE_IO = "io"
+FAILURE_ERROR = "error"
+FAILURE_INVALID = "invalid"
+
+# Failures that may go away when the job is run again
+TRANSIENT_FAILURES = {FAILURE_CRASHED, FAILURE_IO}
+
+DEFAULT_MAX_JOBS_PER_WORKER = 100
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_DELAY = 1.0
+
+# Parameters each operation can't run without
+_REQUIRED_PARAMS = {
+    OPERATION_FILL: ("form", "output"),
+    OPERATION_ATTACH: ("settings", "form_name", "document", "output"),
+}
+
+# Generated forms kept by a worker for attach jobs sharing the same form
+_FORMS_CACHE_SIZE = 8
+
+# Errors of missing or wrong inputs: running the job again gives the same result
+_PERMANENT_OS_ERRORS = (
+    FileNotFoundError,
+    IsADirectoryError,
+    NotADirectoryError,
+    PermissionError,
+)
+
+# Failures leaving the worker in unknown state: it is replaced before the next job
+_WORKER_FAILURES = {FAILURE_TIMEOUT, FAILURE_CRASHED, FAILURE_MEMORY}
+
+# Time given to a worker to exit on its own before it is killed
+_WORKER_STOP_TIMEOUT = 5.0
+# Longest sleep of the scheduler loop, when nothing else wakes it up
+_POLL_INTERVAL = 1.0
+
+
+@dataclass
+class Job:
+    operation: str
+    params: Dict[str, Any]
+
+    @property
+    def id(self) -> str:
+        """Job identity in the state file: the same job has the same id between runs."""
+        data = json.dumps([self.operation, self.params], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def error(self) -> Optional[str]:
+        """Why the job can't be run, None for valid jobs."""
+        required = _REQUIRED_PARAMS.get(self.operation)
+        if required is None:
+            return f"unknown batch operation '{self.operation}'"
+
+        missing = [param for param in required if param not in self.params]
+        if self.operation == OPERATION_FILL and not (
+            "values" in self.params or "field_values" in self.params
+        ):
+            missing.append("values")
+
+        if missing:
+            return f"'{self.operation}' job misses " + ", ".join(
+                f"'{param}'" for param in missing
+            )
+
+        return None
+
+    @staticmethod
+    def from_dict(data: Any) -> "Job":
+        """Job from a jobs file entry. Entries are not validated here: invalid jobs
+        are reported by the runner as failed instead of stopping the whole run."""
+        if not isinstance(data, dict):
+            return Job("", {"entry": data})
+
+        params = dict(data)
+        operation = params.pop("operation", "")
+        return Job(str(operation), params)
+
+    @staticmethod
+    def all_from_stream(yaml_data) -> Iterator["Job"]:
+        """Read jobs from multi-document YAML ('---' separated), a job per document."""
+        documents = yaml.safe_load_all(yaml_data)
+        while True:
+            try:
+                data = next(documents)
+            except StopIteration:
+                return
+            except yaml.YAMLError as err:
+                # The rest of the file can't be read after a syntax error
+                yield Job("", {"entry": f"invalid YAML: {err}"})
+                return
+
+            if data is None:
+                continue
+
+            yield Job.from_dict(data)
+
+    @staticmethod
+    def all_from_file(yaml_file_path: str) -> Iterator["Job"]:
+        with open(yaml_file_path, "rb") as f:
+            yield from Job.all_from_stream(f)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Killed job must not leave partially written output behind
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Caches of a worker process. They live as long as the worker:
+# recycled workers start with empty ones.
+_settings_cache = None
+_forms: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+
+def _run_fill(params: Dict[str, Any]) -> bytes:
+    from core.operations_fill import fill_form
+    from core.settings import FieldValues
+
+    field_values = params.get("field_values")
+    if field_values is None:
+        field_values = FieldValues.from_file(params["values"]).data
+
+    result = io.BytesIO()
+    fill_form(
+        input_pdf=params["form"],
+        field_values=field_values,
+        output_pdf=result,
+        auto_fit=params.get("auto_fit", False),
+    )
+    return result.getvalue()
+
+
+def _form(settings_file: str, form_name: str) -> bytes:
+    from core.operations_gen import create_form
+    from core.settings import FormSettings, SettingsCache
+
+    global _settings_cache
+    if _settings_cache is None:
+        _settings_cache = SettingsCache()
+
+    settings = FormSettings.from_file(settings_file, _settings_cache)
+    key = (settings.content_hash(), form_name)
+    form = _forms.get(key)
+    if form is None:
+        result = io.BytesIO()
+        create_form(settings, form_name, result)
+        form = result.getvalue()
+
+    _forms[key] = form
+    _forms.move_to_end(key)
+    while len(_forms) > _FORMS_CACHE_SIZE:
+        _forms.popitem(last=False)
+
+    return form
+
+
+def _run_attach(params: Dict[str, Any]) -> bytes:
+    from core.operations_gen import attach_form
+
+    form = _form(params["settings"], params["form_name"])
+
+    result = io.BytesIO()
+    attach_form(params["document"], io.BytesIO(form), result)
+    return result.getvalue()
+
+
+def run_job(job: Job) -> None:
+    if job.operation == OPERATION_FILL:
+        data = _run_fill(job.params)
+    else:
+        data = _run_attach(job.params)
+
+    _write_atomic(job.params["output"], data)
+
+
+def _worker_main(
+    conn: multiprocessing.connection.Connection,
+    memory_limit: int,
+    settings_cache_dir: Optional[str],
+):
+    global _settings_cache
+
+    from core.settings import SettingsCache
+
+    _settings_cache = SettingsCache(settings_cache_dir)
+
+    if memory_limit:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+
+        try:
+            run_job(job)
+        except MemoryError:
+            conn.send((FAILURE_MEMORY, "memory limit exceeded"))
+        except _PERMANENT_OS_ERRORS as err:
+            conn.send((FAILURE_ERROR, str(err)))
+        except OSError as err:
+            conn.send((FAILURE_IO, str(err)))
+        except Exception as err:
+            conn.send((FAILURE_ERROR, str(err) or type(err).__name__))
+        else:
+            conn.send(None)
+
+
+class BatchState:
+    """Journal of finished jobs. Lines are appended and flushed as jobs finish,
+    so the state survives the process being killed at any moment."""
+
+    def __init__(self, file_path: Optional[str]):
+        self._file_path: Optional[str] = file_path
+        self._finished: Dict[str, str] = {}
+        self._file = None
+
+        if file_path is None:
+            return
+
+        if os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Last line can be cut when the run was interrupted
+                        continue
+                    self._finished[record["id"]] = record["status"]
+
+        self._file = open(file_path, "a", encoding="utf-8")
+
+    def status(self, job_id: str) -> Optional[str]:
+        return self._finished.get(job_id)
+
+    def mark(self, job_id: str, status: str) -> None:
+        self._finished[job_id] = status
+        if self._file is not None:
+            self._file.write(json.dumps({"id": job_id, "status": status}) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+@dataclass
+class BatchResult:
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0
+    retried: int = 0
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class _Attempt:
+    job: Job
+    number: int = 1
+    not_before: float = 0.0
+
+
+class _Worker:
+    def __init__(self, context, memory_limit: int, settings_cache_dir: Optional[str]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit, settings_cache_dir),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        self.jobs_done: int = 0
+        self.attempt: Optional[_Attempt] = None
+        self.started: float = 0.0
+
+    def start(self, attempt: _Attempt) -> None:
+        self.attempt = attempt
+        self.started = time.monotonic()
+        self.conn.send(attempt.job)
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+
+        self.process.join(_WORKER_STOP_TIMEOUT)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class BatchRunner:
+    """Runs jobs in a pool of worker processes.
+
+    timeout is wall time of a single job in seconds, memory_limit is address space
+    limit of a worker in bytes, None means no limit. Workers are replaced with new ones
+    after max_jobs_per_worker jobs. Transient failures (crashed worker, I/O errors)
+    are retried up to retries times with exponential backoff starting at retry_delay.
+    Workers keep parsed settings in settings_cache_dir between runs.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        max_jobs_per_worker: int = DEFAULT_MAX_JOBS_PER_WORKER,
+        retries: int = DEFAULT_RETRIES,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        state_file: Optional[str] = None,
+        error_report: Optional[str] = None,
+        retry_failed: bool = False,
+        settings_cache_dir: Optional[str] = None,
+    ):
+        self._workers_count: int = workers or os.cpu_count() or 1
+        self._timeout: Optional[float] = timeout
+        self._memory_limit: int = memory_limit or 0
+        self._max_jobs_per_worker: int = max_jobs_per_worker
+        self._retries: int = retries
+        self._retry_delay: float = retry_delay
+        self._state_file: Optional[str] = state_file
+        self._error_report: Optional[str] = error_report
+        self._retry_failed: bool = retry_failed
+        self._settings_cache_dir: Optional[str] = settings_cache_dir
+
+        self._context = multiprocessing.get_context()
+
+    def _skip(self, state: BatchState, job_id: str) -> bool:
+        status = state.status(job_id)
+        if status == STATUS_DONE:
+            return True
+
+        return status == STATUS_FAILED and not self._retry_failed
+
+    def run(self, jobs: Iterable[Job]) -> BatchResult:
+        result = BatchResult()
+        state = BatchState(self._state_file)
+        report = (
+            open(self._error_report, "a", encoding="utf-8")
+            if self._error_report is not None
+            else None
+        )
+        workers: List[_Worker] = []
+        try:
+            self._run(iter(jobs), state, report, workers, result)
+        finally:
+            for worker in workers:
+                worker.kill()
+            state.close()
+            if report is not None:
+                report.close()
+
+        return result
+
+    def _run(
+        self,
+        jobs: Iterator[Job],
+        state: BatchState,
+        report,
+        workers: List[_Worker],
+        result: BatchResult,
+    ) -> None:
+        pending: "deque[_Attempt]" = deque()
+        # Jobs run or queued right now: the same job listed twice is run once
+        queued: Set[str] = set()
+        jobs_left = True
+
+        def finish(attempt: _Attempt, failure: Optional[Tuple[str, str]]):
+            job_id = attempt.job.id
+            if failure is None:
+                state.mark(job_id, STATUS_DONE)
+                result.done += 1
+                queued.discard(job_id)
+                return
+
+            kind, message = failure
+            if kind in TRANSIENT_FAILURES and attempt.number <= self._retries:
+                delay = self._retry_delay * 2 ** (attempt.number - 1)
+                pending.append(
+                    _Attempt(attempt.job, attempt.number + 1, time.monotonic() + delay)
+                )
+                result.retried += 1
+                return
+
+            state.mark(job_id, STATUS_FAILED)
+            queued.discard(job_id)
+            failure_record = {
+                "id": job_id,
+                "operation": attempt.job.operation,
+                **attempt.job.params,
+                "error": kind,
+                "message": message,
+                "attempts": attempt.number,
+            }
+            result.failed += 1
+            result.failures.append(failure_record)
+            if report is not None:
+                report.write(
+                    json.dumps(failure_record, ensure_ascii=False, default=str) + "\n"
+                )
+                report.flush()
+
+        while True:
+            # Jobs are read as workers become free to keep memory use flat for long lists
+            while jobs_left and len(pending) < self._workers_count:
+                job = next(jobs, None)
+                if job is None:
+                    jobs_left = False
+                    break
+
+                job_id = job.id
+                if job_id in queued or self._skip(state, job_id):
+                    result.skipped += 1
+                    continue
+
+                queued.add(job_id)
+                error = job.error()
+                if error is not None:
+                    finish(_Attempt(job), (FAILURE_INVALID, error))
+                    continue
+
+                pending.append(_Attempt(job))
+
+            now = time.monotonic()
+            for i, worker in enumerate(workers):
+                if worker.attempt is None and (
+                    worker.jobs_done >= self._max_jobs_per_worker
+                    or not worker.process.is_alive()
+                ):
+                    worker.stop()
+                    workers[i] = _Worker(
+                        self._context, self._memory_limit, self._settings_cache_dir
+                    )
+
+            while len(workers) < min(self._workers_count, len(pending)):
+                workers.append(
+                    _Worker(self._context, self._memory_limit, self._settings_cache_dir)
+                )
+
+            for worker in workers:
+                if worker.attempt is not None:
+                    continue
+
+                ready = next((a for a in pending if a.not_before <= now), None)
+                if ready is None:
+                    break
+
+                pending.remove(ready)
+                worker.start(ready)
+
+            busy = [worker for worker in workers if worker.attempt is not None]
+            if not busy and not pending and not jobs_left:
+                return
+
+            wait_time = _POLL_INTERVAL
+            for worker in busy:
+                if self._timeout is not None:
+                    wait_time = min(wait_time, worker.started + self._timeout - now)
+            # Pending jobs wake the loop up only when a worker is free to take them.
+            # Jobs ready right now wait for a busy worker to finish.
+            if len(busy) < self._workers_count:
+                for attempt in pending:
+                    if attempt.not_before > now:
+                        wait_time = min(wait_time, attempt.not_before - now)
+
+            handles = [worker.conn for worker in busy]
+            handles += [worker.process.sentinel for worker in busy]
+            ready_handles = multiprocessing.connection.wait(
+                handles, timeout=max(wait_time, 0)
+            )
+
+            now = time.monotonic()
+            for i, worker in enumerate(workers):
+                attempt = worker.attempt
+                if attempt is None:
+                    continue
+
+                if worker.conn in ready_handles:
+                    try:
+                        failure = worker.conn.recv()
+                    except (EOFError, OSError):
+                        failure = (FAILURE_CRASHED, "worker process died")
+                elif worker.process.sentinel in ready_handles:
+                    failure = (
+                        FAILURE_CRASHED,
+                        f"worker process died with exit code {worker.process.exitcode}",
+                    )
+                elif self._timeout is not None and now - worker.started > self._timeout:
+                    failure = (
+                        FAILURE_TIMEOUT,
+                        f"time limit of {self._timeout}s exceeded",
+                    )
+                else:
+                    continue
+
+                worker.attempt = None
+                worker.jobs_done += 1
+                if failure is not None and failure[0] in _WORKER_FAILURES:
+                    worker.kill()
+                    workers[i] = _Worker(
+                        self._context, self._memory_limit, self._settings_cache_dir
+                    )
+
+                finish(attempt, failure)
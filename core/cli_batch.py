@@ -0,0 +1,144 @@
+import re
+import sys
+import click
+
+from core.cli_common import settings_cache_option
+from core.batch import (
+    BatchRunner,
+    Job,
+    DEFAULT_MAX_JOBS_PER_WORKER,
+    DEFAULT_RETRIES,
+    DEFAULT_RETRY_DELAY,
+)
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(value: str) -> int:
+    match = re.fullmatch(r"(\d+)([KMG]?)B?", value.strip().upper())
+    if match is None:
+        raise click.BadParameter(f"'{value}' is not a size like 512M or 2G")
+
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2)]
+
+
+@click.command(name="batch")
+@click.option(
+    "--workers",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Wall time limit of a single job in seconds. The job is killed when it is exceeded.",
+)
+@click.option(
+    "--memory-limit",
+    "memory_limit",
+    default=None,
+    help="Memory limit of a worker process, like 512M or 2G.",
+)
+@click.option(
+    "--max-jobs-per-worker",
+    "max_jobs_per_worker",
+    type=click.IntRange(min=1),
+    default=DEFAULT_MAX_JOBS_PER_WORKER,
+    show_default=True,
+    help="Replace the worker process with a new one after this number of jobs.",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=DEFAULT_RETRIES,
+    show_default=True,
+    help="Number of retries of jobs failed with transient errors (crashed worker, I/O errors).",
+)
+@click.option(
+    "--retry-delay",
+    "retry_delay",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_RETRY_DELAY,
+    show_default=True,
+    help="Delay before the first retry in seconds, doubled for each next one.",
+)
+@click.option(
+    "--state-file",
+    "state_file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Record finished jobs in this file and skip them when the run is started again.",
+)
+@click.option(
+    "--error-report",
+    "error_report",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append failed jobs to this file, one JSON object per line.",
+)
+@click.option(
+    "--retry-failed",
+    "retry_failed",
+    is_flag=True,
+    help="Run again jobs recorded as failed in the state file.",
+)
+@settings_cache_option
+@click.argument("jobs_file", type=click.Path(exists=True, allow_dash=True))
+@click.help_option("--help", "-h", help="Show this message and exit.")
+def batch(
+    jobs_file,
+    workers,
+    timeout,
+    memory_limit,
+    max_jobs_per_worker,
+    retries,
+    retry_delay,
+    state_file,
+    error_report,
+    retry_failed,
+    settings_cache_dir,
+):
+    """Run fill and attach jobs listed in a multi-document YAML file.
+
+    Each job runs in a worker process under time and memory limits.
+    Failed jobs do not stop the run: they are written to the error report
+    and the command exits with code 1 when all the other jobs are done.
+
+    If jobs_file is '-', jobs are read from stdin.
+    """
+    runner = BatchRunner(
+        workers=workers,
+        timeout=timeout,
+        memory_limit=parse_size(memory_limit) if memory_limit is not None else None,
+        max_jobs_per_worker=max_jobs_per_worker,
+        retries=retries,
+        retry_delay=retry_delay,
+        state_file=state_file,
+        error_report=error_report,
+        retry_failed=retry_failed,
+        settings_cache_dir=settings_cache_dir or None,
+    )
+
+    if jobs_file == "-":
+        jobs = Job.all_from_stream(sys.stdin)
+    else:
+        jobs = Job.all_from_file(jobs_file)
+
+    result = runner.run(jobs)
+
+    click.echo(
+        f"done: {result.done}, failed: {result.failed}, "
+        f"skipped: {result.skipped}, retried: {result.retried}",
+        err=True,
+    )
+    for failure in result.failures:
+        click.echo(
+            f"{failure.get('output', failure['id'])}: {failure['error']}: {failure['message']}",
+            err=True,
+        )
+
+    if result.failed:
+        sys.exit(1)
@@ -0,0 +1,25 @@
+"""
+Options shared by several commands.
+
+Is kept free of reportlab and PyPDF4 imports: used by fill-side commands too.
+"""
+
+import click
+
+from core.settings import DEFAULT_SETTINGS_CACHE_DIR, SettingsCache
+
+
+settings_cache_option = click.option(
+    "--settings-cache-dir",
+    "settings_cache_dir",
+    type=click.Path(file_okay=False),
+    default=DEFAULT_SETTINGS_CACHE_DIR,
+    show_default=True,
+    help="Keep parsed settings files in this directory and skip parsing "
+    "of unchanged files next time. Empty value disables the cache.",
+)
+
+
+def settings_cache(cache_dir: str) -> SettingsCache:
+    # Without cache_dir the cache still saves re-parsing of files included many times
+    return SettingsCache(cache_dir or None)
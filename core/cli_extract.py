@@ -0,0 +1,85 @@
+"""
+Extract filled values from PDF forms.
+
+Is stored as a separate module to allow as small imports as possible,
+like cli_fill: reportlab, PyPDF4 and pdfrw are not needed here.
+"""
+
+import click
+
+from core.settings import FormSettings
+from core.cli_common import settings_cache_option, settings_cache
+from core.operations_extract import extract_rows, write_csv, write_ndjson
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+
+@click.command(name="extract")
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice([FORMAT_NDJSON, FORMAT_CSV]),
+    default=FORMAT_NDJSON,
+    help="Output format: one JSON object or CSV row per document.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--files-from",
+    "files_from",
+    type=click.File("r"),
+    default=None,
+    help="Read paths of documents from this file, one per line ('-' for stdin).",
+)
+@click.option(
+    "--output",
+    "-o",
+    "output",
+    type=click.File("w", encoding="utf-8"),
+    default="-",
+    help="Write rows to this file instead of stdout.",
+)
+@settings_cache_option
+@click.argument("form_definitions", required=True, type=click.Path(exists=True))
+@click.argument("form_name", required=True)
+@click.argument("documents", nargs=-1, type=click.Path(exists=True))
+@click.help_option("--help", "-h", help="Show this message and exit.")
+def extract(
+    form_definitions,
+    form_name,
+    documents,
+    output_format,
+    jobs,
+    files_from,
+    output,
+    settings_cache_dir,
+):
+    """Extract filled values from PDF documents with the form.
+
+    Writes a row per document with the value of each field of the form,
+    the path of the document and the error message when the document can't be read.
+    Documents are processed in parallel, rows are written in the order of documents.
+    """
+    settings = FormSettings.from_file(
+        form_definitions, settings_cache(settings_cache_dir)
+    )
+    field_ids = settings.form_field_ids(form_name)
+
+    if files_from is not None:
+        listed = (line.rstrip("\n") for line in files_from)
+        documents = [*documents, *(path for path in listed if path)]
+
+    if not documents:
+        raise click.UsageError("no documents to extract values from")
+
+    rows = extract_rows(documents, field_ids, jobs)
+    if output_format == FORMAT_CSV:
+        write_csv(rows, field_ids, output)
+    else:
+        write_ndjson(rows, output)
@@ -6,13 +6,14 @@ avoiding reportlab and PyPDF4 dependencies and allowing the module
 to be used in restricted containers where reportlab deps cannot be compiled.
 """
 
-from typing import Union, BinaryIO, AnyStr
+from typing import Union, BinaryIO, AnyStr, Iterator
 
 import sys
 import click
 
 from core.settings import FieldValues
-from core.operations_fill import fill_form
+from core.operations_fill import fill_form, fill_form_merged
+from core.fill_cache import FillCache
 
 
 def read_values(values: Union[BinaryIO, AnyStr]) -> FieldValues:
@@ -22,12 +23,41 @@ def read_values(values: Union[BinaryIO, AnyStr]) -> FieldValues:
     return FieldValues.from_stream(values)
 
 
+def read_values_records(values: Union[BinaryIO, AnyStr]) -> Iterator[FieldValues]:
+    if type(values) is str or type(values) is bytes:
+        return FieldValues.all_from_file(values)
+
+    return FieldValues.all_from_stream(values)
+
+
 @click.command(name="fill")
+@click.option(
+    "--merge-into",
+    "merge_into",
+    type=click.Path(),
+    default=None,
+    help="Fill a form copy for each document of multi-document values YAML "
+    "and write all copies into this PDF ('-' for stdout).",
+)
+@click.option(
+    "--cache-dir",
+    "cache_dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Keep filled documents in this directory and reuse them "
+    "for the same form and values.",
+)
+@click.option(
+    "--auto-fit",
+    "auto_fit",
+    is_flag=True,
+    help="Decrease font size of fields until their values fit the fields.",
+)
 @click.argument("pdf_form", type=click.Path(exists=True))
 @click.argument("values_source", type=click.Path(exists=True), required=False)
 @click.argument("pdf_output", type=click.Path(), required=False)
 @click.help_option("--help", "-h", help="Show this message and exit.")
-def fill(pdf_form, values_source, pdf_output):
+def fill(pdf_form, values_source, pdf_output, merge_into, cache_dir, auto_fit):
     """Fill a PDF form with values from a YAML file.
 
     This program takes a PDF form and fills it with values from a YAML file.
@@ -35,6 +65,9 @@ def fill(pdf_form, values_source, pdf_output):
 
     If values_source is not specified or is '-', values are read from stdin.
     If pdf_output is not specified or is '-', output is written to stdout.
+
+    With --merge-into, values_source is a multi-document YAML ('---' separated)
+    and all filled copies are written into one PDF, sharing the form pages content.
     """
     if pdf_form == "-":
         pdf_form = sys.stdin
@@ -45,8 +78,34 @@ def fill(pdf_form, values_source, pdf_output):
     if pdf_form == values_source == sys.stdin:
         click.UsageError("fill command cannot get both PDF and values from stdin")
 
+    if merge_into is not None:
+        if pdf_output is not None:
+            raise click.UsageError("pdf_output cannot be used together with --merge-into")
+
+        pdf_output = merge_into
+
     if pdf_output is None or pdf_output == "-":
         pdf_output = sys.stdout.buffer
 
+    if merge_into is not None:
+        records = (values.data for values in read_values_records(values_source))
+        fill_form_merged(
+            input_pdf=pdf_form,
+            records=records,
+            output_pdf=pdf_output,
+            auto_fit=auto_fit,
+        )
+        return
+
+    cache = None
+    if cache_dir is not None:
+        cache = FillCache(memory_items=0, disk_dir=cache_dir)
+
     field_values = read_values(values_source)
-    fill_form(input_pdf=pdf_form, field_values=field_values.data, output_pdf=pdf_output)
+    fill_form(
+        input_pdf=pdf_form,
+        field_values=field_values.data,
+        output_pdf=pdf_output,
+        cache=cache,
+        auto_fit=auto_fit,
+    )
@@ -2,6 +2,7 @@ import os
 import click
 
 from core.settings import FormSettings
+from core.cli_common import settings_cache_option, settings_cache
 from core.operations_gen import create_form, attach_form
 from core.operations_fill import fill_form
 from core.grid import DefaultGridSettings, GridSettings
@@ -45,18 +46,21 @@ def _add_form_to_file(
     is_flag=True,
     help="Add grid with coordinates to the form",
 )
+@settings_cache_option
 @click.argument("form_definitions", required=True, type=click.Path(exists=True))
 @click.argument("form_name", required=True, type=str)
 @click.argument(
     "form_file", required=False, type=click.Path(exists=False), default="form.pdf"
 )
 @click.help_option("--help", "-h", help="Show this message and exit.")
-def create(form_definitions, form_name, form_file, debug, grid):
+def create(form_definitions, form_name, form_file, debug, grid, settings_cache_dir):
     """Create an empty PDF form form form definitions file.
 
     This file can then be merged with another existing PDF with text to get fillable PDF file.
     """
-    settings = FormSettings.from_file(form_definitions)
+    settings = FormSettings.from_file(
+        form_definitions, settings_cache(settings_cache_dir)
+    )
 
     grid_settings = DefaultGridSettings if grid else None
     create_form(settings, form_name, form_file, debug, grid_settings)
@@ -73,13 +77,20 @@ def create(form_definitions, form_name, form_file, debug, grid):
     is_flag=True,
     help="Add grid with coordinates to the form",
 )
+@settings_cache_option
 @click.argument("form_definitions", required=True, type=click.Path(exists=True))
 @click.argument("form_name", required=True)
 @click.argument("original_document", required=True, type=click.Path(exists=True))
 @click.argument("result_document", required=False, type=click.Path(exists=False))
 @click.help_option("--help", "-h", help="Show this message and exit.")
 def attach(
-    form_definitions, form_name, original_document, result_document, debug, grid
+    form_definitions,
+    form_name,
+    original_document,
+    result_document,
+    debug,
+    grid,
+    settings_cache_dir,
 ):
     """Create and attach a PDF form to an existing document.
 
@@ -89,7 +100,9 @@ def attach(
     if result_document is None:
         result_document = os.path.join(os.path.dirname(original_document), "result.pdf")
 
-    form_settings = FormSettings.from_file(form_definitions)
+    form_settings = FormSettings.from_file(
+        form_definitions, settings_cache(settings_cache_dir)
+    )
     grid_settings = DefaultGridSettings if grid else None
 
     _add_form_to_file(
@@ -103,12 +116,15 @@ def attach(
 
 
 @click.command(name="field-ids")
+@settings_cache_option
 @click.argument("form_definitions", required=True, type=click.Path(exists=True))
 @click.argument("form_name", required=True)
-def field_ids(form_definitions, form_name):
+def field_ids(form_definitions, form_name, settings_cache_dir):
     """Print all field IDs mentioned in a form.
     """
-    settings = FormSettings.from_file(form_definitions)
+    settings = FormSettings.from_file(
+        form_definitions, settings_cache(settings_cache_dir)
+    )
     field_ids = sorted(list(settings.form_field_ids(form_name)))
     for field_id in field_ids:
         print(field_id)
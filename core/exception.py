@@ -1,3 +1,6 @@
+from typing import Tuple
+
+
 class Error(Exception):
     pass
 
@@ -7,3 +10,19 @@ class FormNotFound(Error):
         super(FormNotFound, self).__init__(
             f"definition for form '{name}' not found in '{file_path}'"
         )
+
+
+class FontError(Error):
+    def __init__(self, file_path: str, reason: str):
+        super(FontError, self).__init__(f"cannot load font '{file_path}': {reason}")
+
+
+class IncludeCycle(Error):
+    def __init__(self, file_path: str, including: Tuple[str, ...]):
+        chain = " -> ".join(including + (file_path,))
+        super(IncludeCycle, self).__init__(f"settings include cycle: {chain}")
+
+
+class PdfReadError(Error):
+    def __init__(self, file_path: str, reason: str):
+        super(PdfReadError, self).__init__(f"cannot read PDF '{file_path}': {reason}")
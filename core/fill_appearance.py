@@ -0,0 +1,449 @@
+"""
+Appearance streams for filled text fields.
+
+Lets filled documents render the same way in all viewers without asking them
+to lay out field values on their own (/NeedAppearances).
+Is stored as a separate module to keep fill free of reportlab dependency:
+text is measured with precomputed width tables of standard fonts and with
+/W tables of fonts embedded into the form.
+"""
+
+from typing import Optional, Dict, List, Tuple, Union
+
+import re
+import zlib
+
+import pdfrw
+
+from core.font_widths import PDF_DOC_ENCODING, STANDARD_FONT_WIDTHS
+
+MIN_FONT_SIZE = 4.0
+# Size for fields with auto font size ('0 Tf' in /DA) before it is fitted to the field
+DEFAULT_FONT_SIZE = 12.0
+FONT_SIZE_STEP = 0.5
+
+LEADING = 1.15
+# Space between field border and its text
+PADDING = 2.0
+# Part of font size below the baseline, used to center single line values vertically
+DESCENT = 0.22
+
+FIELD_FLAG_MULTILINE = 1 << 12
+
+ALIGN_LEFT = 0
+ALIGN_CENTER = 1
+ALIGN_RIGHT = 2
+
+_DA_FONT = re.compile(r"/([^\s/]+)\s+([\d.]+)\s+Tf")
+_CMAP_PAIR = re.compile(r"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>")
+_CMAP_RANGE = re.compile(r"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>")
+_CMAP_SECTION = re.compile(r"begin(bfchar|bfrange)(.*?)end\1", re.S)
+
+_PDF_DOC_CODES: Dict[str, int] = {
+    char: code for code, char in enumerate(PDF_DOC_ENCODING) if char != "\0"
+}
+
+
+def _num(value: float) -> str:
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+
+def _color_op(color: Optional[pdfrw.PdfArray], stroke: bool) -> Optional[str]:
+    if not color:
+        return None
+
+    ops = {1: "g", 3: "rg", 4: "k"}
+    op = ops.get(len(color))
+    if op is None:
+        return None
+
+    op = op.upper() if stroke else op
+    return " ".join(_num(float(c)) for c in color) + " " + op
+
+
+def _stream_data(stream: pdfrw.PdfDict) -> Optional[str]:
+    data = stream.stream or ""
+    filters = stream.Filter
+    if filters is None:
+        filters = []
+    elif not isinstance(filters, pdfrw.PdfArray):
+        filters = [filters]
+
+    for stream_filter in filters:
+        if stream_filter != pdfrw.PdfName.FlateDecode:
+            return None
+
+        data = zlib.decompress(data.encode("latin-1")).decode("latin-1")
+
+    return data
+
+
+class _StandardFont:
+    """One of standard 14 PDF fonts with PDFDocEncoding, as reportlab creates them."""
+
+    def __init__(self, widths: Tuple[int, ...]):
+        self._widths = widths
+
+    def _codes(self, text: str) -> bytes:
+        return bytes(_PDF_DOC_CODES[char] for char in text)
+
+    def can_encode(self, text: str) -> bool:
+        return all(char in _PDF_DOC_CODES for char in text)
+
+    def width(self, text: str, font_size: float) -> float:
+        return sum(self._widths[code] for code in self._codes(text)) * font_size / 1000
+
+    def encode(self, text: str) -> str:
+        chars = []
+        for code in self._codes(text):
+            char = chr(code)
+            if char in "()\\":
+                chars.append("\\" + char)
+            elif 32 <= code < 127:
+                chars.append(char)
+            else:
+                chars.append(f"\\{code:03o}")
+
+        return "(" + "".join(chars) + ")"
+
+
+class _CIDFont:
+    """Type0 font with Identity-H encoding and CIDs equal to glyph indexes.
+
+    Characters are mapped to CIDs through the font's /ToUnicode map.
+    """
+
+    def __init__(
+        self,
+        char_to_cid: Dict[str, int],
+        widths: Dict[int, float],
+        default_width: float,
+    ):
+        self._char_to_cid = char_to_cid
+        self._widths = widths
+        self._default_width = default_width
+
+    @staticmethod
+    def from_pdf(font: pdfrw.PdfDict) -> Optional["_CIDFont"]:
+        if font.Encoding != pdfrw.PdfName("Identity-H") or not font.DescendantFonts:
+            return None
+
+        cid_font: pdfrw.PdfDict = font.DescendantFonts[0]
+        cid_to_gid = cid_font.CIDToGIDMap
+        if cid_to_gid is not None and cid_to_gid != pdfrw.PdfName.Identity:
+            return None
+
+        to_unicode = _stream_data(font.ToUnicode) if font.ToUnicode else None
+        if to_unicode is None:
+            return None
+
+        char_to_cid: Dict[str, int] = {}
+        for kind, section in _CMAP_SECTION.findall(to_unicode):
+            if kind == "bfchar":
+                for cid, char in _CMAP_PAIR.findall(section):
+                    char = bytes.fromhex(char).decode("utf-16-be", errors="ignore")
+                    if len(char) == 1:
+                        char_to_cid.setdefault(char, int(cid, 16))
+                continue
+
+            for first, last, char in _CMAP_RANGE.findall(section):
+                char = bytes.fromhex(char).decode("utf-16-be", errors="ignore")
+                if len(char) != 1:
+                    continue
+                for shift in range(int(last, 16) - int(first, 16) + 1):
+                    char_to_cid.setdefault(
+                        chr(ord(char) + shift), int(first, 16) + shift
+                    )
+
+        widths: Dict[int, float] = {}
+        w = cid_font.W or []
+        i = 0
+        while i < len(w):
+            first = int(w[i])
+            if isinstance(w[i + 1], pdfrw.PdfArray):
+                for shift, width in enumerate(w[i + 1]):
+                    widths[first + shift] = float(width)
+                i += 2
+                continue
+
+            last, width = int(w[i + 1]), float(w[i + 2])
+            for cid in range(first, last + 1):
+                widths[cid] = width
+            i += 3
+
+        default_width = float(cid_font.DW) if cid_font.DW is not None else 1000.0
+        return _CIDFont(char_to_cid, widths, default_width)
+
+    def can_encode(self, text: str) -> bool:
+        return all(char in self._char_to_cid for char in text)
+
+    def width(self, text: str, font_size: float) -> float:
+        width = 0.0
+        for char in text:
+            width += self._widths.get(self._char_to_cid[char], self._default_width)
+
+        return width * font_size / 1000
+
+    def encode(self, text: str) -> str:
+        return "<" + "".join("%04X" % self._char_to_cid[char] for char in text) + ">"
+
+
+_FieldFont = Union[_StandardFont, _CIDFont]
+
+
+class AppearanceBuilder:
+    """Builds /AP streams for filled text fields of one document.
+
+    Fields are drawn the way the form generator draws them: background,
+    border and the value clipped by the field borders.
+    With auto_fit, font size is decreased until the value fits the field.
+    Multiline fields are wrapped by words.
+
+    incomplete is set when some field could not get the appearance
+    (unknown font or /DA, characters missing in the field font),
+    so viewers must render it on their own.
+    """
+
+    def __init__(self, acro_form: Optional[pdfrw.PdfDict], auto_fit: bool = False):
+        self._auto_fit: bool = auto_fit
+        self._acro_form: pdfrw.PdfDict = (
+            acro_form if acro_form is not None else pdfrw.PdfDict()
+        )
+
+        resources = self._acro_form.DR
+        self._font_resources: pdfrw.PdfDict = (
+            resources.Font
+            if resources is not None and resources.Font
+            else pdfrw.PdfDict()
+        )
+        self._form_encoding: Optional[pdfrw.PdfDict] = (
+            resources.Encoding.RLAFencoding
+            if resources is not None and resources.Encoding is not None
+            else None
+        )
+        self._fonts: Dict[str, Optional[_FieldFont]] = {}
+        self._appearances: Dict[Tuple, pdfrw.PdfDict] = {}
+
+        self.incomplete: bool = False
+
+    def _inherited(self, widget: pdfrw.PdfDict, key: str):
+        # Field attributes can be set on the widget itself, its parent field or the form
+        node = widget
+        while node is not None:
+            value = node[key]
+            if value is not None:
+                return value
+            node = node.Parent
+
+        return self._acro_form[key]
+
+    def _font(self, name: str) -> Optional[_FieldFont]:
+        if name in self._fonts:
+            return self._fonts[name]
+
+        font_dict = self._font_resources[pdfrw.PdfName(name)]
+        font: Optional[_FieldFont] = None
+        if font_dict is not None:
+            if font_dict.Subtype == pdfrw.PdfName.Type0:
+                font = _CIDFont.from_pdf(font_dict)
+            elif font_dict.BaseFont is not None and self._has_form_encoding(font_dict):
+                widths = STANDARD_FONT_WIDTHS.get(font_dict.BaseFont[1:])
+                font = _StandardFont(widths) if widths is not None else None
+
+        self._fonts[name] = font
+        return font
+
+    def _has_form_encoding(self, font_dict: pdfrw.PdfDict) -> bool:
+        # Width tables are indexed by PDFDocEncoding codes, that reportlab puts
+        # into form resources as /RLAFencoding. Fonts with any other encoding
+        # (WinAnsi, for example) would get wrong bytes for non-ASCII text.
+        encoding = font_dict.Encoding
+        if encoding is None or self._form_encoding is None:
+            return False
+
+        if encoding is self._form_encoding:
+            return True
+
+        differences = getattr(encoding, "Differences", None)
+        return differences is not None and list(differences) == list(
+            self._form_encoding.Differences or []
+        )
+
+    @staticmethod
+    def _wrap(
+        text: str, font: _FieldFont, font_size: float, max_width: float
+    ) -> List[str]:
+        lines: List[str] = []
+        # Trailing line breaks would only add empty lines to fit into the field
+        for paragraph in text.rstrip("\n").split("\n"):
+            words = paragraph.split(" ")
+            line = words[0]
+            for word in words[1:]:
+                candidate = f"{line} {word}"
+                if font.width(candidate, font_size) <= max_width:
+                    line = candidate
+                else:
+                    lines.append(line)
+                    line = word
+
+            lines.append(line)
+
+        return lines
+
+    def _layout(
+        self,
+        text: str,
+        font: _FieldFont,
+        font_size: float,
+        auto_fit: bool,
+        multiline: bool,
+        width: float,
+        height: float,
+    ) -> Tuple[float, List[str]]:
+        while True:
+            if multiline:
+                lines = self._wrap(text, font, font_size, width)
+                text_height = len(lines) * font_size * LEADING
+            else:
+                lines = [text.replace("\n", " ")]
+                text_height = font_size
+
+            fits = text_height <= height and all(
+                font.width(line, font_size) <= width for line in lines
+            )
+            if fits or not auto_fit or font_size <= MIN_FONT_SIZE:
+                return font_size, lines
+
+            font_size = max(MIN_FONT_SIZE, font_size - FONT_SIZE_STEP)
+
+    def build(self, widget: pdfrw.PdfDict, text: str) -> Optional[pdfrw.PdfDict]:
+        appearance = self._build(widget, text)
+        if appearance is None:
+            self.incomplete = True
+
+        return appearance
+
+    def _build(self, widget: pdfrw.PdfDict, text: str) -> Optional[pdfrw.PdfDict]:
+        da = self._inherited(widget, "/DA")
+        rect = widget.Rect
+        if da is None or rect is None:
+            return None
+
+        da = da.decode()
+        font_match = _DA_FONT.search(da)
+        if font_match is None:
+            return None
+
+        font_name = font_match.group(1)
+        font = self._font(font_name)
+        if font is None or not font.can_encode(text.replace("\n", "")):
+            return None
+
+        text_color = (da[: font_match.start()] + da[font_match.end() :]).strip()
+
+        x1, y1, x2, y2 = (float(v) for v in rect)
+        width, height = abs(x2 - x1), abs(y2 - y1)
+
+        border_width = 0.0
+        if widget.BS is not None and widget.BS.W is not None:
+            border_width = float(widget.BS.W)
+
+        mk = widget.MK if widget.MK is not None else pdfrw.PdfDict()
+        background = _color_op(mk.BG, stroke=False)
+        border = _color_op(mk.BC, stroke=True) if border_width else None
+
+        flags = int(self._inherited(widget, "/Ff") or 0)
+        multiline = bool(flags & FIELD_FLAG_MULTILINE)
+        align = int(self._inherited(widget, "/Q") or ALIGN_LEFT)
+
+        font_size = float(font_match.group(2))
+        auto_fit = self._auto_fit or font_size == 0
+        if font_size == 0:
+            font_size = DEFAULT_FONT_SIZE
+
+        padding = border_width + PADDING
+        inner_width = width - 2 * padding
+        inner_height = height - 2 * border_width
+
+        key = (
+            font_name,
+            font_size,
+            _num(width),
+            _num(height),
+            background,
+            border,
+            border_width,
+            text_color,
+            align,
+            multiline,
+            auto_fit,
+            text,
+        )
+        appearance = self._appearances.get(key)
+        if appearance is not None:
+            return appearance
+
+        font_size, lines = self._layout(
+            text, font, font_size, auto_fit, multiline, inner_width, inner_height
+        )
+        leading = font_size * LEADING
+
+        content: List[str] = []
+        if background is not None:
+            content.append(f"q {background} 0 0 {_num(width)} {_num(height)} re f Q")
+        if border is not None:
+            half = border_width / 2
+            content.append(
+                f"q {border} {_num(border_width)} w {_num(half)} {_num(half)} "
+                f"{_num(width - border_width)} {_num(height - border_width)} re s Q"
+            )
+
+        content += [
+            "/Tx BMC",
+            "q",
+            f"{_num(border_width)} {_num(border_width)} "
+            f"{_num(width - 2 * border_width)} {_num(inner_height)} re W n",
+            "BT",
+            f"/{font_name} {_num(font_size)} Tf {text_color}".strip(),
+        ]
+
+        if multiline:
+            y = height - padding - font_size
+        else:
+            y = (height - font_size) / 2 + DESCENT * font_size
+
+        prev_x, prev_y = 0.0, 0.0
+        for line in lines:
+            x = padding
+            if align != ALIGN_LEFT:
+                free_space = inner_width - font.width(line, font_size)
+                x += free_space / 2 if align == ALIGN_CENTER else free_space
+
+            content.append(
+                f"{_num(x - prev_x)} {_num(y - prev_y)} Td {font.encode(line)} Tj"
+            )
+            prev_x, prev_y = x, y
+            y -= leading
+
+        content += ["ET", "Q", "EMC"]
+
+        resources_font = pdfrw.PdfDict()
+        resources_font[pdfrw.PdfName(font_name)] = self._font_resources[
+            pdfrw.PdfName(font_name)
+        ]
+
+        appearance = pdfrw.IndirectPdfDict(
+            Type=pdfrw.PdfName.XObject,
+            Subtype=pdfrw.PdfName.Form,
+            BBox=pdfrw.PdfArray(
+                [pdfrw.PdfObject(_num(v)) for v in (0, 0, width, height)]
+            ),
+            Resources=pdfrw.PdfDict(
+                ProcSet=pdfrw.PdfArray([pdfrw.PdfName.PDF, pdfrw.PdfName.Text]),
+                Font=resources_font,
+            ),
+        )
+        appearance.stream = "\n".join(content)
+
+        self._appearances[key] = appearance
+        return appearance
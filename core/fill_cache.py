@@ -0,0 +1,227 @@
+"""
+Cache of filled PDF documents.
+
+Filling is deterministic: the same form filled with the same values always gives
+byte-identical output. That allows to keep the results keyed by the hashes of the
+form content and normalized values and serve repeated requests without parsing any PDF.
+
+Is kept free of reportlab and pdfrw imports for the same reasons as operations_fill.
+"""
+
+from typing import Optional, Dict, Any, Union, AnyStr, BinaryIO
+from collections import OrderedDict
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+DEFAULT_MEMORY_ITEMS = 128
+DEFAULT_DISK_MAX_BYTES = 512 * 1024 * 1024
+
+_DISK_SUFFIX = ".pdf"
+
+# Version of fill output, part of every cache key. Increase it with any change
+# of fill_form giving different bytes for the same form and values,
+# so that documents cached by older versions are not served anymore.
+FILL_OUTPUT_VERSION = 1
+
+
+def read_document(document: Union[BinaryIO, AnyStr]) -> bytes:
+    if type(document) is str or type(document) is bytes:
+        with open(document, "rb") as f:
+            return f.read()
+
+    if hasattr(document, "buffer"):
+        # Text streams like sys.stdin
+        document = document.buffer
+
+    return document.read()
+
+
+def write_document(document: Union[BinaryIO, AnyStr], data: bytes) -> None:
+    if type(document) is str or type(document) is bytes:
+        with open(document, "wb") as f:
+            f.write(data)
+        return
+
+    document.write(data)
+
+
+def normalize_values(field_values: Dict[str, Any]) -> Dict[str, Any]:
+    """Bring values to the form fill_form sees them.
+
+    Values giving the same document get the same representation: None values are skipped
+    as they do not change the field, all non-boolean values are put as strings.
+    """
+    normalized: Dict[str, Any] = {}
+    for name, value in field_values.items():
+        if value is None:
+            continue
+
+        normalized[str(name)] = value if type(value) == bool else str(value)
+
+    return normalized
+
+
+class FillCache:
+    """Two-tier cache of filled documents: in-memory LRU and optional on-disk storage.
+
+    Disk tier keeps each document in a separate file inside disk_dir. When the total size
+    of files exceeds disk_max_bytes, least recently used ones are removed.
+    """
+
+    def __init__(
+        self,
+        memory_items: int = DEFAULT_MEMORY_ITEMS,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    ):
+        self._memory_items: int = memory_items
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+
+        self._disk_dir: Optional[str] = disk_dir
+        self._disk_max_bytes: int = disk_max_bytes
+        self._disk_size: Optional[int] = None
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(template: bytes, field_values: Dict[str, Any], **options: Any) -> str:
+        """Key of filled document. options are fill options changing the result."""
+        template_hash = hashlib.sha256(template).hexdigest()
+        values_data = json.dumps(
+            [normalize_values(field_values), options],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        values_hash = hashlib.sha256(values_data.encode("utf-8")).hexdigest()
+
+        return hashlib.sha256(
+            f"{FILL_OUTPUT_VERSION}:{template_hash}:{values_hash}".encode()
+        ).hexdigest()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._get_disk_size(),
+        }
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._memory_get(key)
+        if data is None:
+            data = self._disk_get(key)
+            if data is not None:
+                self._memory_put(key, data)
+
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._memory_put(key, data)
+        self._disk_put(key, data)
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+
+        return data
+
+    def _memory_put(self, key: str, data: bytes) -> None:
+        if self._memory_items <= 0:
+            return
+
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self._disk_dir, key + _DISK_SUFFIX)
+
+    def _get_disk_size(self) -> int:
+        if self._disk_dir is None:
+            return 0
+
+        if self._disk_size is None:
+            self._disk_size = sum(
+                entry.stat().st_size for entry in self._disk_entries()
+            )
+
+        return self._disk_size
+
+    def _disk_entries(self):
+        with os.scandir(self._disk_dir) as entries:
+            return [
+                entry
+                for entry in entries
+                if entry.is_file() and entry.name.endswith(_DISK_SUFFIX)
+            ]
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if self._disk_dir is None:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        # mtime is used as 'last used' mark for eviction
+        os.utime(path)
+        return data
+
+    def _disk_put(self, key: str, data: bytes) -> None:
+        if self._disk_dir is None or len(data) > self._disk_max_bytes:
+            return
+
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+
+        self._get_disk_size()
+
+        # Write to temporary file first to never expose partially written documents
+        # to other processes sharing the same directory.
+        fd, tmp_path = tempfile.mkstemp(dir=self._disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._disk_size += len(data)
+        if self._disk_size > self._disk_max_bytes:
+            self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        entries = sorted(self._disk_entries(), key=lambda e: e.stat().st_mtime)
+
+        # Other processes may write to the same directory, so the real size is recounted
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= self._disk_max_bytes:
+                break
+
+            try:
+                entry_size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+
+            size -= entry_size
+
+        self._disk_size = size
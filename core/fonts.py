@@ -0,0 +1,152 @@
+"""
+TrueType fonts for form fields.
+
+Parsing of TrueType file takes noticeable time for large fonts, so parsed metrics
+are cached on disk, keyed by the hash of font file contents.
+Is kept free of reportlab imports at module level: metrics loaded from cache
+can be used in restricted containers where reportlab deps cannot be compiled.
+"""
+
+from typing import Optional, Dict, List
+from dataclasses import dataclass, field
+
+import hashlib
+import io
+import os
+import pickle
+import re
+import tempfile
+
+from .exception import FontError
+
+
+DEFAULT_FONT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "pdf-form-generator", "fonts"
+)
+
+# Bump when FontMetrics structure changes to ignore stale cache entries
+_CACHE_VERSION = 1
+
+
+@dataclass
+class FontMetrics:
+    # PostScript name of the font
+    name: str
+    ascent: float
+    descent: float
+    cap_height: float
+    bbox: List[float]
+    italic_angle: float
+    stem_v: int
+    flags: int
+    # Widths are in 1/1000 of font size, as PDF expects them
+    default_width: float
+    glyph_widths: List[float]
+    char_to_glyph: Dict[int, int]
+    # Font program is not cached: it is read from the font file anyway to get its hash
+    font_file: bytes = field(default=b"", repr=False)
+
+    def char_width(self, char: str) -> float:
+        glyph = self.char_to_glyph.get(ord(char))
+        if glyph is None or glyph >= len(self.glyph_widths):
+            return self.default_width
+
+        return self.glyph_widths[glyph]
+
+    def text_width(self, text: str, font_size: float) -> float:
+        return sum(self.char_width(char) for char in text) * font_size / 1000
+
+
+def true_type_font_resource_name(font_name: str) -> str:
+    """Name of the font in form resources (/DR) and field appearance (/DA)."""
+    return "TT" + re.sub(r"[^A-Za-z0-9]", "", font_name)
+
+
+def parse_font(font_data: bytes, file_path: str = "<stream>") -> FontMetrics:
+    from reportlab.pdfbase.ttfonts import TTFontFile, TTFError
+
+    try:
+        ttf = TTFontFile(io.BytesIO(font_data))
+    except TTFError as err:
+        raise FontError(file_path, str(err))
+
+    scale = 1000.0 / ttf.unitsPerEm
+    glyph_widths = [round(advance * scale, 3) for advance, _ in ttf.hmetrics]
+
+    return FontMetrics(
+        name=ttf.name.decode() if isinstance(ttf.name, bytes) else ttf.name,
+        ascent=ttf.ascent,
+        descent=ttf.descent,
+        cap_height=ttf.capHeight,
+        bbox=list(ttf.bbox),
+        italic_angle=ttf.italicAngle,
+        stem_v=ttf.stemV,
+        flags=ttf.flags,
+        default_width=ttf.defaultWidth,
+        glyph_widths=glyph_widths,
+        char_to_glyph=dict(ttf.charToGlyph),
+        font_file=font_data,
+    )
+
+
+class FontCache:
+    """Parsed font metrics cache: in-memory for the process and on disk between runs."""
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_FONT_CACHE_DIR):
+        self._cache_dir: Optional[str] = cache_dir
+        self._loaded: Dict[str, FontMetrics] = {}
+
+    def _cache_path(self, font_hash: str) -> str:
+        return os.path.join(self._cache_dir, f"{font_hash}.v{_CACHE_VERSION}.pickle")
+
+    def _read_cached(self, font_hash: str) -> Optional[FontMetrics]:
+        if self._cache_dir is None:
+            return None
+
+        try:
+            with open(self._cache_path(font_hash), "rb") as f:
+                metrics = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            # Missing or broken cache entry: font will be parsed again
+            return None
+
+        return metrics if isinstance(metrics, FontMetrics) else None
+
+    def _write_cached(self, font_hash: str, metrics: FontMetrics) -> None:
+        if self._cache_dir is None:
+            return
+
+        font_file, metrics.font_file = metrics.font_file, b""
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(metrics, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._cache_path(font_hash))
+        except OSError:
+            # Cache is an optimization only. Read-only home is not a reason to fail.
+            pass
+        finally:
+            metrics.font_file = font_file
+
+    def load(self, font_file_path: str) -> FontMetrics:
+        try:
+            with open(font_file_path, "rb") as f:
+                font_data = f.read()
+        except OSError as err:
+            raise FontError(font_file_path, err.strerror)
+
+        font_hash = hashlib.sha256(font_data).hexdigest()
+
+        metrics = self._loaded.get(font_hash)
+        if metrics is not None:
+            return metrics
+
+        metrics = self._read_cached(font_hash)
+        if metrics is None:
+            metrics = parse_font(font_data, font_file_path)
+            self._write_cached(font_hash, metrics)
+
+        metrics.font_file = font_data
+        self._loaded[font_hash] = metrics
+        return metrics
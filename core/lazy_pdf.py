@@ -0,0 +1,475 @@
+"""
+Minimal lazy PDF reader.
+
+Only cross-reference data is read when document is opened; objects are parsed
+on first access. Reading a few objects of a large document costs about the same
+as reading them from a small one, unlike pdfrw that parses all object streams
+and the whole page tree up front.
+
+Supports what is needed to read form data: xref tables and streams, object streams,
+incremental updates and FlateDecode filter. Encrypted documents are not supported.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import functools
+import re
+import zlib
+
+from core.exception import PdfReadError
+from core.font_widths import PDF_DOC_ENCODING
+
+_WS = rb"[\x00\t\n\f\r ]"
+_REGULAR = rb"[^\x00\t\n\f\r ()<>\[\]{}/%]"
+_SKIP = re.compile(rb"(?:%s+|%%[^\r\n]*)*" % _WS)
+# One regex for all tokens: skipping whitespace, matching and dispatching tokens
+# with separate calls takes most of the parsing time.
+_TOKEN = re.compile(
+    rb"(?:%(ws)s+|%%[^\r\n]*)*"
+    rb"(?:(?P<dict><<)|(?P<dict_end>>>)|(?P<array>\[)|(?P<array_end>\])"
+    rb"|/(?P<name>%(regular)s*)"
+    rb"|\((?P<simple_string>[^\\()]*)\)|(?P<string>\()|<(?P<hex>[^>]*)>"
+    rb"|(?P<ref>\d+)%(ws)s+(?P<gen>\d+)%(ws)s+R(?!%(regular)s)"
+    rb"|(?P<int>[+-]?\d+)(?!%(regular)s)"
+    rb"|(?P<token>%(regular)s+))" % {b"ws": _WS, b"regular": _REGULAR}
+)
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_OCTAL = re.compile(rb"[0-7]{1,3}")
+_NOT_HEX = re.compile(rb"[^0-9A-Fa-f]")
+_LITERAL_CHUNK = re.compile(rb"[^\\()]*")
+# Codes where PDFDocEncoding differs from ASCII
+_PDF_DOC_SPECIAL = re.compile(rb"[\x18-\x1f\x80-\xff]")
+_OBJECT_HEADER = re.compile(
+    rb"[\x00\t\n\f\r ]*(\d+)[\x00\t\n\f\r ]+(\d+)[\x00\t\n\f\r ]+obj"
+)
+_XREF_SUBSECTION = re.compile(rb"(\d+)[\x00\t\n\f\r ]+(\d+)")
+_XREF_ENTRY = re.compile(
+    rb"[\x00\t\n\f\r ]*(\d{10})[\x00\t\n\f\r ]+\d{5}[\x00\t\n\f\r ]+([nf])"
+)
+_STREAM_START = re.compile(rb"stream\r?\n")
+
+_LITERAL_ESCAPES = {
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+    ord("("): b"(",
+    ord(")"): b")",
+    ord("\\"): b"\\",
+}
+
+# startxref is expected close to the end of file
+_TAIL_SIZE = 2048
+
+
+class Name(str):
+    """PDF name, without leading slash. Plain str values are not used for names
+    to tell them apart from strings, that are kept as bytes."""
+
+
+class Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+class Stream(NamedTuple):
+    dict: Dict[str, Any]
+    raw: bytes
+
+
+def decode_text(data: bytes) -> str:
+    """Decode PDF text string: UTF-16BE or UTF-8 with BOM, PDFDocEncoding otherwise."""
+    if data.startswith(b"\xfe\xff"):
+        return data[2:].decode("utf-16-be", errors="replace")
+
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data[3:].decode("utf-8", errors="replace")
+
+    if _PDF_DOC_SPECIAL.search(data) is None:
+        return data.decode("ascii")
+
+    return "".join(
+        PDF_DOC_ENCODING[code] if PDF_DOC_ENCODING[code] != "\0" else chr(code)
+        for code in data
+    )
+
+
+def _name(match: re.Match) -> Name:
+    return _decode_name(match.group("name"))
+
+
+@functools.lru_cache(maxsize=1024)
+def _decode_name(name: bytes) -> Name:
+    # Documents use the same few dozens of names over and over
+    if b"#" in name:
+        name = _NAME_ESCAPE.sub(lambda m: bytes.fromhex(m.group(1).decode()), name)
+
+    return Name(name.decode("utf-8", errors="replace"))
+
+
+class _Parser:
+    """Parser of PDF objects in data buffer. Indirect references are not resolved."""
+
+    def __init__(self, data: bytes):
+        self.data: bytes = data
+
+    def skip(self, pos: int) -> int:
+        return _SKIP.match(self.data, pos).end()
+
+    def parse(self, pos: int) -> Tuple[Any, int]:
+        match = _TOKEN.match(self.data, pos)
+        if match is None:
+            raise ValueError(f"unexpected data at {pos}")
+
+        kind = match.lastgroup
+        end = match.end()
+
+        if kind == "name":
+            return _name(match), end
+
+        if kind == "int":
+            return int(match.group("int")), end
+
+        # 'gen' is the last group of a reference
+        if kind == "gen":
+            return Ref(int(match.group("ref")), int(match.group("gen"))), end
+
+        if kind == "simple_string":
+            return match.group("simple_string"), end
+
+        if kind == "dict":
+            return self._parse_dict(end)
+
+        if kind == "array":
+            return self._parse_array(end)
+
+        if kind == "string":
+            return self._parse_literal_string(end)
+
+        if kind == "hex":
+            digits = _NOT_HEX.sub(b"", match.group("hex"))
+            if len(digits) % 2:
+                digits += b"0"
+            return bytes.fromhex(digits.decode()), end
+
+        token = match.group("token")
+        if token is None:
+            raise ValueError(f"unexpected {match.group(kind)!r} at {pos}")
+
+        if _NUMBER.fullmatch(token):
+            return float(token), end
+
+        if token == b"true":
+            return True, end
+        if token == b"false":
+            return False, end
+        if token == b"null":
+            return None, end
+
+        raise ValueError(f"unexpected token {token!r} at {pos}")
+
+    def _parse_dict(self, pos: int) -> Tuple[Dict[str, Any], int]:
+        result: Dict[str, Any] = {}
+        while True:
+            match = _TOKEN.match(self.data, pos)
+            if match is None:
+                raise ValueError(f"unexpected data at {pos}")
+
+            if match.lastgroup == "dict_end":
+                return result, match.end()
+
+            if match.lastgroup != "name":
+                raise ValueError(f"dictionary key expected at {pos}")
+
+            result[_name(match)], pos = self.parse(match.end())
+
+    def _parse_array(self, pos: int) -> Tuple[List[Any], int]:
+        result: List[Any] = []
+        while True:
+            match = _TOKEN.match(self.data, pos)
+            if match is not None and match.lastgroup == "array_end":
+                return result, match.end()
+
+            item, pos = self.parse(pos)
+            result.append(item)
+
+    def _parse_literal_string(self, pos: int) -> Tuple[bytes, int]:
+        data = self.data
+        result = bytearray()
+        depth = 1
+        while True:
+            chunk = _LITERAL_CHUNK.match(data, pos)
+            result += chunk.group()
+            pos = chunk.end()
+
+            char = data[pos]
+            pos += 1
+            if char == 0x5C:  # backslash
+                escaped = data[pos]
+                pos += 1
+                if escaped in _LITERAL_ESCAPES:
+                    result += _LITERAL_ESCAPES[escaped]
+                elif 0x30 <= escaped <= 0x37:
+                    octal = _OCTAL.match(data, pos - 1, pos + 2).group()
+                    result.append(int(octal, 8) & 0xFF)
+                    pos += len(octal) - 1
+                elif escaped == 0x0D:
+                    # Line continuation
+                    if data[pos : pos + 1] == b"\n":
+                        pos += 1
+                elif escaped != 0x0A:
+                    result.append(escaped)
+                continue
+
+            if char == 0x28:
+                depth += 1
+            elif char == 0x29:
+                depth -= 1
+                if depth == 0:
+                    return bytes(result), pos
+
+            result.append(char)
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    row_size = columns + 1
+    previous = bytearray(columns)
+    result = bytearray()
+    for start in range(0, len(data), row_size):
+        filter_type = data[start]
+        row = bytearray(data[start + 1 : start + row_size])
+        for i in range(len(row)):
+            left = row[i - 1] if i > 0 else 0
+            up = previous[i]
+            if filter_type == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif filter_type == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif filter_type == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif filter_type == 4:
+                up_left = previous[i - 1] if i > 0 else 0
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                if pa <= pb and pa <= pc:
+                    predictor = left
+                elif pb <= pc:
+                    predictor = up
+                else:
+                    predictor = up_left
+                row[i] = (row[i] + predictor) & 0xFF
+        result += row
+        previous = row
+
+    return bytes(result)
+
+
+class LazyPdf:
+    def __init__(self, data: bytes, file_path: str = "<stream>"):
+        self._file_path: str = file_path
+        self._parser = _Parser(data)
+        # Object number -> offset in file or (object stream number, index in stream)
+        self._xref: Dict[int, Any] = {}
+        self._objects: Dict[int, Any] = {}
+        self._object_streams: Dict[int, Tuple[_Parser, List[int]]] = {}
+
+        try:
+            self.trailer: Dict[str, Any] = self._read_xref()
+        except (ValueError, IndexError, KeyError, TypeError, zlib.error) as err:
+            raise PdfReadError(file_path, f"broken cross-reference data: {err}")
+
+        if "Encrypt" in self.trailer:
+            raise PdfReadError(file_path, "encrypted documents are not supported")
+
+    @staticmethod
+    def from_file(file_path: str) -> "LazyPdf":
+        with open(file_path, "rb") as f:
+            return LazyPdf(f.read(), file_path)
+
+    def get(self, num: int) -> Any:
+        if num not in self._objects:
+            try:
+                self._objects[num] = self._load(num)
+            except (ValueError, IndexError, KeyError, TypeError, zlib.error) as err:
+                raise PdfReadError(self._file_path, f"broken object {num}: {err}")
+
+        return self._objects[num]
+
+    def resolve(self, value: Any) -> Any:
+        seen = set()
+        while isinstance(value, Ref):
+            if value.num in seen:
+                raise PdfReadError(
+                    self._file_path, f"reference loop at object {value.num}"
+                )
+            seen.add(value.num)
+            value = self.get(value.num)
+
+        return value
+
+    def _load(self, num: int) -> Any:
+        location = self._xref.get(num)
+        if location is None:
+            return None
+
+        if isinstance(location, tuple):
+            stream_num, index = location
+            parser, offsets = self._object_stream(stream_num)
+            return parser.parse(offsets[index])[0]
+
+        return self._read_object(location)
+
+    def _read_object(self, pos: int) -> Any:
+        header = _OBJECT_HEADER.match(self._parser.data, pos)
+        if header is None:
+            raise ValueError(f"object expected at {pos}")
+
+        value, pos = self._parser.parse(header.end())
+        if not isinstance(value, dict):
+            return value
+
+        stream = _STREAM_START.match(self._parser.data, self._parser.skip(pos))
+        if stream is None:
+            return value
+
+        data = self._parser.data
+        start = stream.end()
+        length = self.resolve(value.get("Length"))
+        end = start + length if isinstance(length, int) else -1
+        if end < 0 or data.find(b"endstream", end, end + 32) < 0:
+            # Wrong /Length is a common defect, look for the end marker instead
+            end = data.index(b"endstream", start)
+            while end > start and data[end - 1] in b"\r\n":
+                end -= 1
+
+        return Stream(value, data[start:end])
+
+    def stream_data(self, stream: Stream) -> bytes:
+        filters = self.resolve(stream.dict.get("Filter")) or []
+        params = self.resolve(stream.dict.get("DecodeParms")) or {}
+        if not isinstance(filters, list):
+            filters = [filters]
+        if isinstance(params, list):
+            params = params[0] if params else {}
+        params = self.resolve(params) or {}
+
+        data = stream.raw
+        for stream_filter in filters:
+            if stream_filter != "FlateDecode":
+                raise PdfReadError(
+                    self._file_path, f"unsupported filter {stream_filter}"
+                )
+            data = zlib.decompress(data)
+
+        predictor = params.get("Predictor", 1)
+        if predictor >= 10:
+            data = _png_unpredict(
+                data, params.get("Columns", 1) * params.get("Colors", 1)
+            )
+        elif predictor != 1:
+            raise PdfReadError(self._file_path, f"unsupported predictor {predictor}")
+
+        return data
+
+    def _object_stream(self, num: int) -> Tuple[_Parser, List[int]]:
+        if num not in self._object_streams:
+            stream = self.get(num)
+            if not isinstance(stream, Stream):
+                raise ValueError(f"object stream {num} not found")
+
+            parser = _Parser(self.stream_data(stream))
+            first = stream.dict["First"]
+            offsets = []
+            pos = 0
+            for _ in range(stream.dict["N"]):
+                _, pos = parser.parse(pos)
+                offset, pos = parser.parse(pos)
+                offsets.append(first + offset)
+
+            self._object_streams[num] = (parser, offsets)
+
+        return self._object_streams[num]
+
+    def _read_xref(self) -> Dict[str, Any]:
+        data = self._parser.data
+        start = data.rfind(b"startxref", -_TAIL_SIZE)
+        if start < 0:
+            raise ValueError("startxref not found")
+
+        pos, _ = self._parser.parse(start + len(b"startxref"))
+
+        trailer: Optional[Dict[str, Any]] = None
+        seen = set()
+        # The last section goes first: entries of incremental updates override older ones
+        while isinstance(pos, int) and pos not in seen:
+            seen.add(pos)
+            section_start = self._parser.skip(pos)
+            if data.startswith(b"xref", section_start):
+                entries: Dict[int, Optional[int]] = {}
+                section = self._read_xref_table(section_start + len(b"xref"), entries)
+                if isinstance(section.get("XRefStm"), int):
+                    # Hybrid file: objects stored in object streams are listed
+                    # in the stream, the table has them as free
+                    self._read_xref_stream(section["XRefStm"])
+                for num, location in entries.items():
+                    self._xref.setdefault(num, location)
+            else:
+                section = self._read_xref_stream(section_start)
+
+            if trailer is None:
+                trailer = section
+            pos = section.get("Prev")
+
+        return trailer
+
+    def _read_xref_table(
+        self, pos: int, entries: Dict[int, Optional[int]]
+    ) -> Dict[str, Any]:
+        data = self._parser.data
+        while True:
+            pos = self._parser.skip(pos)
+            if data.startswith(b"trailer", pos):
+                trailer, _ = self._parser.parse(pos + len(b"trailer"))
+                return trailer
+
+            subsection = _XREF_SUBSECTION.match(data, pos)
+            if subsection is None:
+                raise ValueError(f"xref subsection expected at {pos}")
+
+            first, count = int(subsection.group(1)), int(subsection.group(2))
+            pos = subsection.end()
+            for num in range(first, first + count):
+                entry = _XREF_ENTRY.match(data, pos)
+                if entry is None:
+                    raise ValueError(f"xref entry expected at {pos}")
+                pos = entry.end()
+                # Object freed by an incremental update hides its older revisions
+                entries[num] = int(entry.group(1)) if entry.group(2) == b"n" else None
+
+    def _read_xref_stream(self, pos: int) -> Dict[str, Any]:
+        stream = self._read_object(pos)
+        if not isinstance(stream, Stream):
+            raise ValueError(f"xref stream expected at {pos}")
+
+        data = self.stream_data(stream)
+        widths = stream.dict["W"]
+        index = stream.dict.get("Index", [0, stream.dict["Size"]])
+        pos = 0
+        for first, count in zip(index[::2], index[1::2]):
+            for num in range(first, first + count):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos : pos + width], "big"))
+                    pos += width
+                # Missing type field means type 1
+                entry_type = fields[0] if widths[0] else 1
+                if entry_type == 1:
+                    self._xref.setdefault(num, fields[1])
+                elif entry_type == 2:
+                    self._xref.setdefault(num, (fields[1], fields[2]))
+                else:
+                    self._xref.setdefault(num, None)
+
+        return stream.dict
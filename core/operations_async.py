@@ -0,0 +1,318 @@
+"""
+asyncio API for form operations.
+
+PDF parsing and generation are CPU-bound, so the work is run in an executor,
+keeping the event loop free. Workers get and return plain bytes: thread and process
+pools can be used the same way.
+
+Generation modules are imported inside workers only, so the fill part can be used
+without reportlab and PyPDF4, like operations_fill.
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+import asyncio
+import contextlib
+import inspect
+import io
+import os
+import tempfile
+import weakref
+
+from core.fill_cache import read_document
+
+DEFAULT_MAX_CONCURRENCY = os.cpu_count() or 1
+
+# Anything fill_form accepts, bytes with document content or object with (async) read()
+# returning the whole content, or async iterable of content chunks.
+AsyncSource = Any
+# Path, or object with (async) write(). For asyncio.StreamWriter drain() is awaited as well.
+AsyncSink = Any
+
+
+def _fill_worker(template: bytes, field_values: Dict, auto_fit: bool) -> bytes:
+    from core.operations_fill import fill_form
+
+    result = io.BytesIO()
+    fill_form(io.BytesIO(template), field_values, result, auto_fit=auto_fit)
+    return result.getvalue()
+
+
+def _create_worker(settings, form_name: str, debug: bool, grid, font_cache) -> bytes:
+    from core.operations_gen import create_form
+
+    result = io.BytesIO()
+    create_form(settings, form_name, result, debug, grid, font_cache)
+    return result.getvalue()
+
+
+def _attach_worker(original_document: bytes, form: bytes) -> bytes:
+    from core.operations_gen import attach_form
+
+    result = io.BytesIO()
+    attach_form(io.BytesIO(original_document), io.BytesIO(form), result)
+    return result.getvalue()
+
+
+def _write_temp_file(directory: str, data: bytes) -> str:
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return tmp_path
+
+
+def _release(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore) -> None:
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        # The loop is closed, its semaphore is not used anymore
+        pass
+
+
+def _remove_temp_file(future: asyncio.Future) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+
+    try:
+        os.remove(future.result())
+    except FileNotFoundError:
+        pass
+
+
+class FormRunner:
+    """Runs form operations in executor, limiting the number of concurrent operations.
+
+    executor is any concurrent.futures executor: a ThreadPoolExecutor is enough
+    for I/O bound callers, a ProcessPoolExecutor gives real parallelism.
+    None means a pool of max_concurrency threads created on first use.
+
+    Operations over max_concurrency wait before their input is read, so callers
+    producing documents faster than they are processed are slowed down
+    instead of keeping all the pending documents in memory.
+    The limit applies to each event loop separately: the runner can be used
+    by consecutive asyncio.run() calls or by loops of different threads.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be positive")
+
+        self.executor: Optional[Executor] = executor
+        self.max_concurrency: int = max_concurrency
+        # Semaphores are bound to the loop they are used in
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _executor(self) -> Executor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_concurrency)
+
+        return self.executor
+
+    @contextlib.asynccontextmanager
+    async def _slot(self) -> AsyncIterator[Callable[..., Awaitable[bytes]]]:
+        """Take one of max_concurrency slots, yields function running a job in executor.
+
+        Cancelling the job cancels it if it has not started yet. Started job runs
+        to the end, its result is dropped, and the slot is kept until it finishes:
+        the executor never gets more than max_concurrency jobs of the runner.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+
+        await semaphore.acquire()
+        jobs = []
+
+        async def run(func: Callable, *args) -> bytes:
+            job: Future = self._executor().submit(func, *args)
+            jobs.append(job)
+            return await asyncio.wrap_future(job)
+
+        try:
+            yield run
+        finally:
+            if jobs and not jobs[-1].done():
+                jobs[-1].add_done_callback(lambda _: _release(loop, semaphore))
+            else:
+                semaphore.release()
+
+    @staticmethod
+    async def _write_file(path: str, data: bytes) -> None:
+        # Result is written to a temporary file next to the target and renamed then:
+        # the target either keeps the old content or gets the complete new one.
+        loop = asyncio.get_running_loop()
+        directory = os.path.dirname(os.path.abspath(path))
+        write = loop.run_in_executor(None, _write_temp_file, directory, data)
+        try:
+            tmp_path = await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # Write can't be interrupted, the file is removed when it completes
+            write.add_done_callback(_remove_temp_file)
+            raise
+
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+
+    async def _read(self, source: AsyncSource) -> bytes:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source)
+
+        if isinstance(source, (str, os.PathLike)):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, read_document, os.fspath(source))
+
+        if hasattr(source, "__aiter__"):
+            return b"".join([chunk async for chunk in source])
+
+        data = source.read()
+        if inspect.isawaitable(data):
+            data = await data
+
+        return data
+
+    async def _write(self, sink: AsyncSink, data: bytes) -> None:
+        if isinstance(sink, (str, os.PathLike)):
+            await self._write_file(os.fspath(sink), data)
+            return
+
+        written = sink.write(data)
+        if inspect.isawaitable(written):
+            await written
+
+        drain = getattr(sink, "drain", None)
+        if drain is not None:
+            await drain()
+
+    async def fill_form(
+        self,
+        input_pdf: AsyncSource,
+        field_values: Optional[Dict] = None,
+        output_pdf: Optional[AsyncSink] = None,
+        auto_fit: bool = False,
+    ) -> bytes:
+        async with self._slot() as run:
+            template = await self._read(input_pdf)
+            result = await run(_fill_worker, template, field_values or {}, auto_fit)
+
+            if output_pdf is not None:
+                await self._write(output_pdf, result)
+
+        return result
+
+    async def create_form(
+        self,
+        settings,
+        form_name: str,
+        output_pdf: Optional[AsyncSink] = None,
+        debug: bool = False,
+        grid=None,
+        font_cache=None,
+    ) -> bytes:
+        async with self._slot() as run:
+            result = await run(
+                _create_worker, settings, form_name, debug, grid, font_cache
+            )
+
+            if output_pdf is not None:
+                await self._write(output_pdf, result)
+
+        return result
+
+    async def attach_form(
+        self,
+        original_document: AsyncSource,
+        form: AsyncSource,
+        result_document: Optional[AsyncSink] = None,
+    ) -> bytes:
+        async with self._slot() as run:
+            original, form_data = await asyncio.gather(
+                self._read(original_document), self._read(form)
+            )
+            result = await run(_attach_worker, original, form_data)
+
+            if result_document is not None:
+                await self._write(result_document, result)
+
+        return result
+
+
+_default_runner: Optional[FormRunner] = None
+
+
+def default_runner() -> FormRunner:
+    global _default_runner
+
+    if _default_runner is None:
+        _default_runner = FormRunner()
+
+    return _default_runner
+
+
+def configure(
+    executor: Optional[Executor] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> FormRunner:
+    """Replace the runner used by module-level coroutines."""
+    global _default_runner
+
+    _default_runner = FormRunner(executor, max_concurrency)
+    return _default_runner
+
+
+async def fill_form_async(
+    input_pdf: AsyncSource,
+    field_values: Optional[Dict] = None,
+    output_pdf: Optional[AsyncSink] = None,
+    auto_fit: bool = False,
+    runner: Optional[FormRunner] = None,
+) -> bytes:
+    """Async version of operations_fill.fill_form.
+
+    Returns filled document and writes it to output_pdf when it is given.
+    Output is written only when the document is complete: cancelled or failed
+    call leaves no partial output.
+    """
+    runner = runner or default_runner()
+    return await runner.fill_form(input_pdf, field_values, output_pdf, auto_fit)
+
+
+async def create_form_async(
+    settings,
+    form_name: str,
+    output_pdf: Optional[AsyncSink] = None,
+    debug: bool = False,
+    grid=None,
+    font_cache=None,
+    runner: Optional[FormRunner] = None,
+) -> bytes:
+    """Async version of operations_gen.create_form. Returns generated form."""
+    runner = runner or default_runner()
+    return await runner.create_form(
+        settings, form_name, output_pdf, debug, grid, font_cache
+    )
+
+
+async def attach_form_async(
+    original_document: AsyncSource,
+    form: AsyncSource,
+    result_document: Optional[AsyncSink] = None,
+    runner: Optional[FormRunner] = None,
+) -> bytes:
+    """Async version of operations_gen.attach_form. Returns the document with form attached."""
+    runner = runner or default_runner()
+    return await runner.attach_form(original_document, form, result_document)
@@ -0,0 +1,182 @@
+"""
+Extract filled values from PDF forms.
+
+Only the /AcroForm field tree is read, objects are loaded lazily through
+the cross-reference data (see lazy_pdf). Pages, their contents and appearance
+streams are never touched, so extraction time barely depends on document size.
+
+Is kept free of reportlab, PyPDF4 and pdfrw imports, like operations_fill.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TextIO
+
+import csv
+import functools
+import json
+import multiprocessing
+import os
+
+from core.lazy_pdf import LazyPdf, Name, Ref, decode_text
+
+# Extra columns of each row. Field values go under their field ids.
+COLUMN_DOCUMENT = "document"
+COLUMN_ERROR = "error"
+
+DEFAULT_CHUNK_SIZE = 16
+
+_CHECKBOX_OFF = "Off"
+_FIELD_TYPE_BUTTON = "Btn"
+
+
+def _decode_value(pdf: LazyPdf, value: Any) -> Any:
+    value = pdf.resolve(value)
+    if isinstance(value, bytes):
+        return decode_text(value)
+
+    if isinstance(value, Name):
+        # Checkboxes and radio buttons keep the name of the selected state
+        return value != _CHECKBOX_OFF
+
+    if isinstance(value, list):
+        return [_decode_value(pdf, item) for item in value]
+
+    return value
+
+
+def _widget_state(pdf: LazyPdf, field: Dict, kids: List[Dict]) -> Optional[bool]:
+    # fill_form sets only appearance state of checkboxes, the field value
+    # keeps /Off written by the generator
+    states = [
+        widget.get("AS") for widget in [field] + kids if widget.get("AS") is not None
+    ]
+    if not states:
+        return None
+
+    return any(pdf.resolve(state) != _CHECKBOX_OFF for state in states)
+
+
+def _walk_fields(
+    pdf: LazyPdf,
+    fields: List[Any],
+    parent_name: str,
+    parent_type: Any,
+    parent_value: Any,
+    values: Dict[str, Any],
+    seen: set,
+) -> None:
+    for ref in fields:
+        if isinstance(ref, Ref):
+            if ref.num in seen:
+                continue
+            seen.add(ref.num)
+
+        field = pdf.resolve(ref)
+        if not isinstance(field, dict):
+            continue
+
+        name = pdf.resolve(field.get("T"))
+        if isinstance(name, bytes):
+            name = decode_text(name)
+            full_name = f"{parent_name}.{name}" if parent_name else name
+        else:
+            full_name = parent_name
+
+        # Field type and value are inheritable
+        field_type = pdf.resolve(field["FT"]) if "FT" in field else parent_type
+        value = field["V"] if "V" in field else parent_value
+
+        kid_refs = pdf.resolve(field.get("Kids")) or []
+        kids = [pdf.resolve(kid) for kid in kid_refs]
+        kids = [kid for kid in kids if isinstance(kid, dict)]
+        if any("T" in kid for kid in kids):
+            _walk_fields(pdf, kid_refs, full_name, field_type, value, values, seen)
+            continue
+
+        # Terminal field: kids, if any, are its widgets
+        if not full_name:
+            continue
+
+        state = None
+        if field_type == _FIELD_TYPE_BUTTON or value is None:
+            state = _widget_state(pdf, field, kids)
+
+        if state is not None:
+            values[full_name] = state
+        elif value is not None:
+            values[full_name] = _decode_value(pdf, value)
+        else:
+            values[full_name] = None
+
+
+def extract_values(input_pdf: str) -> Dict[str, Any]:
+    """Read values of all form fields: full field name -> value.
+
+    Text fields give strings, checkboxes give booleans,
+    fields without value give None.
+    """
+    pdf = LazyPdf.from_file(input_pdf)
+
+    root = pdf.resolve(pdf.trailer.get("Root")) or {}
+    acro_form = pdf.resolve(root.get("AcroForm")) or {}
+    fields = pdf.resolve(acro_form.get("Fields")) or []
+
+    values: Dict[str, Any] = {}
+    _walk_fields(pdf, fields, "", None, None, values, set())
+    return values
+
+
+def _extract_row(field_ids: Tuple[str, ...], document: str) -> Dict[str, Any]:
+    row: Dict[str, Any] = {COLUMN_DOCUMENT: document, COLUMN_ERROR: None}
+    try:
+        values = extract_values(document)
+    except Exception as err:
+        # Single damaged document should not stop processing of the whole batch
+        values = {}
+        row[COLUMN_ERROR] = str(err) or type(err).__name__
+
+    for field_id in field_ids:
+        row[field_id] = values.get(field_id)
+
+    return row
+
+
+def extract_rows(
+    documents: Iterable[str],
+    field_ids: Iterable[str],
+    jobs: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Extract values of field_ids from each of documents, in jobs worker processes.
+
+    Yields one row per document, in the order of documents, as soon as it is ready.
+    Row has value of each field id, path of the document and error message
+    (None for documents read successfully).
+    """
+    extract = functools.partial(_extract_row, tuple(sorted(field_ids)))
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs == 1:
+        yield from map(extract, documents)
+        return
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(extract, documents, chunksize=chunk_size)
+
+
+def row_columns(field_ids: Iterable[str]) -> List[str]:
+    return [COLUMN_DOCUMENT, COLUMN_ERROR] + sorted(field_ids)
+
+
+def write_ndjson(rows: Iterable[Dict[str, Any]], output: TextIO) -> None:
+    for row in rows:
+        output.write(json.dumps(row, ensure_ascii=False))
+        output.write("\n")
+
+
+def write_csv(
+    rows: Iterable[Dict[str, Any]], field_ids: Iterable[str], output: TextIO
+) -> None:
+    writer = csv.DictWriter(output, fieldnames=row_columns(field_ids))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
@@ -6,22 +6,95 @@ avoiding reportlab and PyPDF4 dependencies and allowing the module
 to be used in restricted containers where reportlab deps cannot be compiled.
 """
 
-from typing import Optional, Dict, Union, AnyStr, BinaryIO
+from typing import Optional, Dict, Iterable, List, Union, AnyStr, BinaryIO
+
+import io
 
 import pdfrw
 
 import core.const as const
+from core.fill_cache import FillCache, read_document, write_document
+from core.fill_appearance import AppearanceBuilder
+
+
+def _fill_annotation(
+    annotation: pdfrw.PdfDict, field_values: Dict, appearances: AppearanceBuilder
+) -> None:
+    annotation_name = annotation.get(const.ANNOT_NAME)
+    if annotation_name is None:
+        return
+
+    annotation_name = (
+        annotation_name.decode()
+    )  # restore original annotation name to make comparison work
+    value = field_values.get(annotation_name)
+
+    if value is None:
+        return
+
+    if type(value) == bool:
+        if value:
+            annotation.update(pdfrw.PdfDict(AS=pdfrw.PdfName("Yes")))
+    else:
+        appearance = appearances.build(annotation, str(value))
+        annotation.update(
+            pdfrw.PdfDict(
+                V=str(value),
+                AP=pdfrw.PdfDict(N=appearance) if appearance is not None else "",
+            )
+        )
+
+
+def _set_need_appearances(acro_form: pdfrw.PdfDict, appearances: AppearanceBuilder):
+    # Viewers render fields with no appearance only when asked explicitly.
+    # Fields with generated appearances are rendered faster and the same way everywhere.
+    acro_form.update(
+        pdfrw.PdfDict(
+            NeedAppearances=(
+                pdfrw.PdfObject("true") if appearances.incomplete else None
+            )
+        )
+    )
 
 
 def fill_form(
     input_pdf,
     field_values: Optional[Dict] = None,
     output_pdf: Union[BinaryIO, AnyStr] = None,
+    cache: Optional[FillCache] = None,
+    auto_fit: bool = False,
 ):
+    """Fill form fields of input_pdf with field_values and write result to output_pdf.
+
+    Appearance of filled text fields is rendered into the document.
+    With auto_fit, font size of a field is decreased until its value fits the field.
+
+    The output is deterministic: the same form and values always give the same bytes.
+    When cache is given, the result is looked up there first by the hashes
+    of the form content and values, and the form is not even parsed on cache hit.
+    """
     if field_values is None:
         field_values = {}
 
+    if cache is not None:
+        template = read_document(input_pdf)
+        key = cache.key(template, field_values, auto_fit=auto_fit)
+
+        result = cache.get(key)
+        if result is None:
+            result_stream = io.BytesIO()
+            fill_form(
+                io.BytesIO(template), field_values, result_stream, auto_fit=auto_fit
+            )
+            result = result_stream.getvalue()
+            cache.put(key, result)
+
+        write_document(output_pdf, result)
+        return
+
     template_pdf: pdfrw.PdfReader = pdfrw.PdfReader(input_pdf)
+    appearances = AppearanceBuilder(template_pdf.Root.AcroForm, auto_fit=auto_fit)
+
     page: pdfrw.PdfDict
     for page in template_pdf.pages:
         annotations: Optional[pdfrw.PdfArray] = page[const.KEY_ANNOTATIONS]
@@ -30,26 +103,109 @@ def fill_form(
 
         for annotation in annotations:
             if annotation[const.KEY_SUBTYPE] == const.SUBTYPE_WIDGET:
+                _fill_annotation(annotation, field_values, appearances)
 
-                annotation_name = annotation.get(const.ANNOT_NAME)
-                if annotation_name is None:
-                    continue
+    _set_need_appearances(template_pdf.Root.AcroForm, appearances)
+    pdfrw.PdfWriter().write(output_pdf, template_pdf)
 
-                annotation_name = (
-                    annotation_name.decode()
-                )  # restore original annotation name to make comparison work
-                value = field_values.get(annotation_name)
 
-                if value is None:
-                    continue
+def _share(obj: Optional[pdfrw.PdfObject]) -> None:
+    # Direct objects are serialized inline into every page that uses them.
+    # Indirect ones are written once and referenced from all the copies.
+    if isinstance(obj, (pdfrw.PdfDict, pdfrw.PdfArray)):
+        obj.indirect = True
 
-                if type(value) == bool:
-                    if value:
-                        annotation.update(pdfrw.PdfDict(AS=pdfrw.PdfName("Yes")))
-                else:
-                    annotation.update(pdfrw.PdfDict(V=str(value), AP=""))
 
-    template_pdf.Root.AcroForm.update(
-        pdfrw.PdfDict(NeedAppearances=pdfrw.PdfObject("true"))
-    )
-    pdfrw.PdfWriter().write(output_pdf, template_pdf)
+def _copy_field(
+    field: pdfrw.PdfDict, parent: pdfrw.PdfDict, copies: Dict[int, pdfrw.PdfDict]
+) -> pdfrw.PdfDict:
+    # The whole field subtree is copied: kids of a copy must point to it as /Parent
+    field_copy = pdfrw.IndirectPdfDict(field, Parent=parent)
+    copies[id(field)] = field_copy
+
+    if field.Kids is not None:
+        field_copy.Kids = pdfrw.PdfArray(
+            [_copy_field(kid, field_copy, copies) for kid in field.Kids]
+        )
+
+    return field_copy
+
+
+def fill_form_merged(
+    input_pdf,
+    records: Iterable[Dict],
+    output_pdf: Union[BinaryIO, AnyStr] = None,
+    auto_fit: bool = False,
+):
+    """Fill a copy of the form for each record and write all copies into one PDF.
+
+    Page contents and resources of the form are stored once and shared by all copies.
+    Only fields and annotations are created for every copy. Fields of copy N are put
+    under the parent field named 'N' (starting from 1), so 'name' becomes 'N.name'
+    and copies do not share values.
+    """
+    template_pdf: pdfrw.PdfReader = pdfrw.PdfReader(input_pdf)
+    template_form: pdfrw.PdfDict = template_pdf.Root.AcroForm
+    # Copies with the same value in a field share its appearance
+    appearances = AppearanceBuilder(template_form, auto_fit=auto_fit)
+
+    page: pdfrw.PdfDict
+    for page in template_pdf.pages:
+        inheritable = page.inheritable
+        _share(inheritable.Resources)
+        _share(page.Contents)
+
+    writer = pdfrw.PdfWriter()
+    copy_fields: List[pdfrw.PdfDict] = []
+
+    for copy_num, field_values in enumerate(records, start=1):
+        copy_field = pdfrw.IndirectPdfDict(T=pdfrw.PdfString.encode(str(copy_num)))
+        # Template object id -> its copy, for fields, widgets and other annotations
+        copies: Dict[int, pdfrw.PdfDict] = {}
+        copy_field.Kids = pdfrw.PdfArray(
+            [
+                _copy_field(field, copy_field, copies)
+                for field in template_form.Fields or []
+            ]
+        )
+        copy_fields.append(copy_field)
+
+        for page in template_pdf.pages:
+            annotations: Optional[pdfrw.PdfArray] = page[const.KEY_ANNOTATIONS]
+            writer.addpage(page)
+            page_copy: pdfrw.PdfDict = writer.pagearray[-1]
+
+            if annotations is None:
+                continue
+
+            annotations_copy = pdfrw.PdfArray()
+            for annotation in annotations:
+                annotation_copy = copies.get(id(annotation))
+                if annotation_copy is None:
+                    annotation_copy = pdfrw.IndirectPdfDict(annotation)
+                    copies[id(annotation)] = annotation_copy
+                    if annotation[const.KEY_SUBTYPE] == const.SUBTYPE_WIDGET:
+                        # Widget missing in the field tree
+                        annotation_copy.Parent = copy_field
+                        copy_field.Kids.append(annotation_copy)
+
+                annotation_copy.P = page_copy
+                if annotation[const.KEY_SUBTYPE] == const.SUBTYPE_WIDGET:
+                    _fill_annotation(annotation_copy, field_values, appearances)
+
+                annotations_copy.append(annotation_copy)
+
+            page_copy.Annots = annotations_copy
+
+        # Markup annotations and their popups refer to each other
+        for annotation_copy in copies.values():
+            for key in ("Popup", "IRT", "Parent"):
+                target = copies.get(id(getattr(annotation_copy, key)))
+                if target is not None:
+                    setattr(annotation_copy, key, target)
+
+    acro_form = pdfrw.PdfDict(template_form)
+    acro_form.update(pdfrw.PdfDict(Fields=pdfrw.PdfArray(copy_fields)))
+    _set_need_appearances(acro_form, appearances)
+    writer.trailer.Root.AcroForm = acro_form
+    writer.write(output_pdf)
@@ -1,4 +1,4 @@
-from typing import Optional 
+from typing import Optional, Union, AnyStr, BinaryIO
 
 from reportlab.pdfgen import canvas
 import reportlab.lib.colors as colors
@@ -6,16 +6,19 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from PyPDF4 import PdfFileWriter, PdfFileReader, pdf
 
-from core.settings import FormSettings
+from core.settings import FormSettings, FIELD_KIND_CHECKBOX
 from core.grid import GridSettings, draw_grid
+from core.appearance import SharedAppearanceForm
+from core.fonts import FontCache
 
 
 def create_form(
     settings: FormSettings,
     form_name: str,
-    filename: str = "simple_form.pdf",
+    filename: Union[BinaryIO, str] = "simple_form.pdf",
     debug: bool = False,
     grid: GridSettings | None = None,
+    font_cache: FontCache | None = None,
 ):
     c = canvas.Canvas(
         filename=filename,
@@ -25,7 +28,16 @@ def create_form(
     c.setFont("Helvetica", 10)
 
     form_fields_settings = settings.form(form_name)
-    form = c.acroForm
+    # Fields with the same look share a single appearance stream
+    form = SharedAppearanceForm.attach(c)
+
+    fonts = settings.fonts()
+    used_fonts = {field.font_name for page in form_fields_settings for field in page}
+    for font_name in used_fonts.intersection(fonts):
+        if font_cache is None:
+            font_cache = FontCache()
+
+        form.add_font(font_name, font_cache.load(fonts[font_name]))
 
     for page_fields in form_fields_settings:
         if grid is not None:
@@ -38,6 +50,22 @@ def create_form(
                 border_color = "red"
                 border_width = 2
 
+            fill_color = field.fill_color if field.fill_color else colors.transparent
+
+            if field.kind == FIELD_KIND_CHECKBOX:
+                form.checkbox(
+                    name=field.name,
+                    tooltip=field.tooltip,
+                    x=field.x * mm,
+                    y=field.y * mm,
+                    size=field.h,
+                    fillColor=fill_color,
+                    borderWidth=border_width,
+                    borderColor=getattr(colors, border_color),
+                    fieldFlags=" ".join(field.flags),
+                )
+                continue
+
             form.textfield(
                 name=field.name,
                 tooltip=field.tooltip,
@@ -46,7 +74,7 @@ def create_form(
                 width=field.w * mm,
                 height=field.h,
                 maxlen=field.maxlen,
-                fillColor=field.fill_color if field.fill_color else colors.transparent,
+                fillColor=fill_color,
                 borderWidth=border_width,
                 borderColor=getattr(colors, border_color),
                 fontName=field.font_name,
@@ -60,9 +88,9 @@ def create_form(
 
 
 def attach_form(
-    original_document: str = "original.pdf",
-    form: str = "form.pdf",
-    result_document: str = "result.pdf",
+    original_document: Union[BinaryIO, AnyStr] = "original.pdf",
+    form: Union[BinaryIO, AnyStr] = "form.pdf",
+    result_document: Union[BinaryIO, AnyStr] = "result.pdf",
 ):
     form_reader = PdfFileReader(form)
     form_size = form_reader.getNumPages()
@@ -99,5 +127,9 @@ def attach_form(
         {pdf.NameObject("/AcroForm"): form_reader.trailer["/Root"]["/AcroForm"]}
     )
 
+    if hasattr(result_document, "write"):
+        result_writer.write(result_document)
+        return
+
     with open(result_document, "wb") as out:
         result_writer.write(out)
@@ -1,8 +1,34 @@
-from typing import List, Optional, Dict, Set, Union, BinaryIO, TextIO, AnyStr, Any
+from typing import (
+    List,
+    Optional,
+    Dict,
+    Set,
+    Union,
+    BinaryIO,
+    TextIO,
+    AnyStr,
+    Any,
+    Iterator,
+    Tuple,
+)
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
 
 import yaml
 
-from .exception import FormNotFound
+from .exception import FormNotFound, IncludeCycle
+
+
+DEFAULT_SETTINGS_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "pdf-form-generator", "settings"
+)
+
+FIELD_KIND_TEXT = "text"
+FIELD_KIND_CHECKBOX = "checkbox"
 
 
 class FormField:
@@ -21,6 +47,7 @@ class FormField:
         border_width: Optional[float] = None,
         border_color: Optional[str] = None,
         fill_color: Optional[str] = None,
+        kind: Optional[str] = None,
         field_type: Optional["FormField"] = None,
     ):
         self._name: Optional[str] = name
@@ -36,6 +63,7 @@ class FormField:
         self._border_width: Optional[float] = border_width
         self._border_color: Optional[str] = border_color
         self._fill_color: Optional[str] = fill_color
+        self._kind: Optional[str] = kind
         self._field_type: Optional["FormField"] = field_type
 
     def _get_property(self, prop_name, default_val: Any) -> Any:
@@ -104,6 +132,10 @@ class FormField:
     def fill_color(self) -> Optional[str]:
         return self._get_property("fill_color", None)
 
+    @property
+    def kind(self) -> str:
+        return self._get_property("kind", FIELD_KIND_TEXT)
+
     @property
     def field_type(self) -> Optional["FormField"]:
         return self._field_type
@@ -143,9 +175,11 @@ class FormGroup:
             flags=field.flags,
             maxlen=field.maxlen,
             font_size=field.font_size,
+            font_name=field.font_name,
             border_width=field.border_width,
             border_color=field.border_color,
             fill_color=field.fill_color,
+            kind=field.kind,
             field_type=field.field_type,
         )
 
@@ -157,6 +191,150 @@ class FormGroup:
         return fields_list
 
 
+def _without(settings: Dict, key: str) -> Dict:
+    # Raw settings are never modified: they can be shared through SettingsCache
+    return {k: v for k, v in settings.items() if k != key}
+
+
+def _parse_settings(yaml_data: Union[BinaryIO, TextIO, bytes]) -> Dict:
+    data: Optional[Dict] = yaml.safe_load(yaml_data)
+    if data is None:
+        return {}
+
+    return data.get("form_settings", {})
+
+
+class SettingsCache:
+    """Parsed settings files cache, keyed by file contents hash.
+
+    Settings libraries shared by many forms are parsed only once: files are re-read
+    only when their modification time or size changes and re-parsed only when
+    their contents change. With cache_dir, parsed files are kept on disk between runs.
+    Parsed settings are shared between all users of the cache and must not be modified.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self._cache_dir: Optional[str] = cache_dir
+        # file path -> (mtime, size, contents hash)
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+        # contents hash -> parsed settings
+        self._parsed: Dict[str, Dict] = {}
+
+    def _cache_path(self, content_hash: str) -> str:
+        return os.path.join(self._cache_dir, f"{content_hash}.pickle")
+
+    def _read_cached(self, content_hash: str) -> Optional[Dict]:
+        if self._cache_dir is None:
+            return None
+
+        try:
+            with open(self._cache_path(content_hash), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_cached(self, content_hash: str, settings: Dict) -> None:
+        if self._cache_dir is None:
+            return
+
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(settings, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._cache_path(content_hash))
+        except OSError:
+            pass
+
+    def load(self, file_path: str) -> Dict:
+        """Get contents of 'form_settings' key of the file, without includes resolved."""
+        stat = os.stat(file_path)
+        file_state = (stat.st_mtime_ns, stat.st_size)
+
+        known = self._files.get(file_path)
+        if known is not None and known[:2] == file_state:
+            return self._parsed[known[2]]
+
+        with open(file_path, "rb") as f:
+            content = f.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        self._files[file_path] = (*file_state, content_hash)
+
+        settings = self._parsed.get(content_hash)
+        if settings is None:
+            settings = self._read_cached(content_hash)
+        if settings is None:
+            settings = _parse_settings(content)
+            self._write_cached(content_hash, settings)
+
+        self._parsed[content_hash] = settings
+        return settings
+
+
+def _read_settings(file_path: str, cache: Optional[SettingsCache]) -> Dict:
+    if cache is not None:
+        return cache.load(file_path)
+
+    with open(file_path, "rb") as f:
+        return _parse_settings(f)
+
+
+def _merge_section(merged: Dict, section: str, section_settings: Any) -> None:
+    if isinstance(section_settings, dict):
+        merged.setdefault(section, {}).update(section_settings)
+    else:
+        merged[section] = section_settings
+
+
+def _resolve_includes(
+    raw_settings: Dict,
+    base_dir: str,
+    cache: Optional[SettingsCache],
+    including: Tuple[str, ...] = (),
+) -> Dict:
+    """Merge settings with the files from its 'include' list.
+
+    Included files go first, in the order of the list, so the including file can redefine
+    types, groups, forms and fonts of included ones.
+    Relative paths in 'include' and 'fonts' are resolved against the directory
+    of the file they are written in.
+    """
+    includes: Union[str, List[str]] = raw_settings.get("include", [])
+    if isinstance(includes, str):
+        includes = [includes]
+
+    merged: Dict = {}
+    for include in includes:
+        include_path = os.path.normpath(
+            os.path.join(base_dir, os.path.expanduser(include))
+        )
+        if include_path in including:
+            raise IncludeCycle(include_path, including)
+
+        included = _resolve_includes(
+            _read_settings(include_path, cache),
+            os.path.dirname(include_path),
+            cache,
+            including + (include_path,),
+        )
+        for section, section_settings in included.items():
+            _merge_section(merged, section, section_settings)
+
+    for section, section_settings in raw_settings.items():
+        if section == "include":
+            continue
+
+        if section == "fonts":
+            section_settings = {
+                font_name: os.path.join(base_dir, os.path.expanduser(font_path))
+                for font_name, font_path in section_settings.items()
+            }
+
+        _merge_section(merged, section, section_settings)
+
+    return merged
+
+
 class FormSettings:
     def __init__(self, settings: Dict):
         self._raw_settings: Dict = settings
@@ -167,16 +345,29 @@ class FormSettings:
         self._forms: Dict[str, TypeForm] = self._parse_forms(settings)
 
     @staticmethod
-    def from_stream(yaml_data: Union[BinaryIO, TextIO]) -> "FormSettings":
-        data: Dict = yaml.safe_load(yaml_data)
-        return FormSettings(data.get("form_settings", {}))
+    def from_stream(
+        yaml_data: Union[BinaryIO, TextIO],
+        base_dir: str = "",
+        cache: Optional["SettingsCache"] = None,
+    ) -> "FormSettings":
+        """Load settings from stream. Included files are searched relative to base_dir."""
+        raw_settings = _parse_settings(yaml_data)
+        return FormSettings(_resolve_includes(raw_settings, base_dir, cache))
 
     @staticmethod
-    def from_file(yaml_file_path: AnyStr) -> "FormSettings":
-        with open(yaml_file_path, "rb") as f:
-            s = FormSettings.from_stream(f)
-            s._settings_file = yaml_file_path
-            return s
+    def from_file(
+        yaml_file_path: AnyStr, cache: Optional["SettingsCache"] = None
+    ) -> "FormSettings":
+        file_path = os.path.abspath(yaml_file_path)
+        raw_settings = _read_settings(file_path, cache)
+
+        s = FormSettings(
+            _resolve_includes(
+                raw_settings, os.path.dirname(file_path), cache, (file_path,)
+            )
+        )
+        s._settings_file = yaml_file_path
+        return s
 
     @staticmethod
     def _parse_field_types(_raw_settings: Dict) -> Dict[str, FormField]:
@@ -200,7 +391,7 @@ class FormSettings:
                 _init_type(parent_type_name, field_types[parent_type_name])
                 parent_type = parsed_field_types[parent_type_name]
 
-            type_settings.pop("type", None)
+            type_settings = _without(type_settings, "type")
             parsed_field_types[type_name] = FormField(
                 **type_settings, field_type=parent_type
             )
@@ -212,14 +403,14 @@ class FormSettings:
 
     def _expand_field(self, field_settings: Dict):
         type_name = field_settings.get("type", "default")
-        field_settings.pop("type", None)
+        field_settings = _without(field_settings, "type")
 
         field_type: FormField = self._field_types[type_name]
         return FormField(**field_settings, field_type=field_type)
 
     def _expand_group(self, group_settings: Dict) -> TypeFieldGroup:
         group_name: str = group_settings["group"]
-        group_settings.pop("group", None)
+        group_settings = _without(group_settings, "group")
 
         group: FormGroup = self._field_groups[group_name]
         return group.expand(**group_settings)
@@ -265,8 +456,9 @@ class FormSettings:
                         _init_group(child_group_name, field_groups[child_group_name])
                         child_group = parsed_field_groups[child_group_name]
 
-                    field_settings.pop("group", None)
-                    group.add_fields(*child_group.expand(**field_settings))
+                    group.add_fields(
+                        *child_group.expand(**_without(field_settings, "group"))
+                    )
 
                 else:
                     field = self._expand_field(field_settings=field_settings)
@@ -345,12 +537,24 @@ class FormSettings:
     def del_field_group(self, group_name: str) -> "FormSettings":
         return self.add_field_group(group_name, None)
 
+    def fonts(self) -> Dict[str, str]:
+        """TrueType fonts declared in settings: font name -> font file path.
+
+        Relative paths are resolved against the directory of settings file declaring the font.
+        """
+        return self._raw_settings.get("fonts", {})
+
     def form(self, form_name: str) -> List[List[FormField]]:
         if form_name not in self._forms:
             raise FormNotFound(name=form_name, file_path=self._settings_file)
 
         return self._forms[form_name]
 
+    def content_hash(self) -> str:
+        """Hash of settings with includes resolved: settings with equal hashes give equal forms."""
+        data = json.dumps(self._raw_settings, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
     def form_field_ids(self, form_name: str) -> Set[str]:
         form = self.form(form_name)
         ids = set()
@@ -374,3 +578,17 @@ class FieldValues:
     def from_file(yaml_file_path: AnyStr) -> "FieldValues":
         with open(yaml_file_path, "rb") as f:
             return FieldValues.from_stream(f)
+
+    @staticmethod
+    def all_from_stream(yaml_data: Union[BinaryIO, TextIO]) -> Iterator["FieldValues"]:
+        """Read values from each document of multi-document YAML ('---' separated)."""
+        for data in yaml.safe_load_all(yaml_data):
+            if data is None:
+                continue
+
+            yield FieldValues(data.get("field_values", {}))
+
+    @staticmethod
+    def all_from_file(yaml_file_path: AnyStr) -> Iterator["FieldValues"]:
+        with open(yaml_file_path, "rb") as f:
+            yield from FieldValues.all_from_stream(f)
@@ -4,6 +4,8 @@ import click
 
 from core.cli_gen import create, attach, field_ids
 from core.cli_fill import fill
+from core.cli_extract import extract
+from core.cli_batch import batch
 
 @click.group()
 @click.help_option("--help", "-h", help="Show this message and exit.")
@@ -15,6 +17,8 @@ cli.add_command(create)
 cli.add_command(attach)
 cli.add_command(field_ids)
 cli.add_command(fill)
+cli.add_command(extract)
+cli.add_command(batch)
 
 if __name__ == "__main__":
     cli()
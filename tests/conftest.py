@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.settings import FormSettings  # noqa: E402
+
+EXAMPLES = os.path.join(ROOT, "examples")
+
+CHECKBOX_SETTINGS = """
+form_settings:
+  types:
+    default: { h: 15, maxlen: 100, font_size: 10, font_name: 'Helvetica', flags: ['doNotScroll'] }
+    check: { kind: checkbox, h: 10, flags: [] }
+  forms:
+    f:
+      - - { name: a, x: 10, y: 10, w: 40 }
+        - { name: c1, x: 60, y: 10, type: check }
+        - { name: c2, x: 60, y: 30, type: check }
+"""
+
+
+@pytest.fixture(scope="session")
+def example_form(tmp_path_factory) -> str:
+    """Example document with the example form attached."""
+    from core.operations_gen import create_form, attach_form
+
+    result = str(tmp_path_factory.mktemp("example") / "form.pdf")
+    settings = FormSettings.from_file(os.path.join(EXAMPLES, "form-settings.yaml"))
+    form_file = result + ".form"
+    create_form(settings, "my_awesome_form", form_file)
+    attach_form(os.path.join(EXAMPLES, "document.pdf"), form_file, result)
+    return result
+
+
+@pytest.fixture(scope="session")
+def checkbox_form(tmp_path_factory) -> str:
+    """Form with text field 'a' and checkboxes 'c1' and 'c2'."""
+    from core.operations_gen import create_form
+
+    directory = tmp_path_factory.mktemp("checkbox")
+    settings_file = directory / "settings.yaml"
+    settings_file.write_text(CHECKBOX_SETTINGS)
+
+    result = str(directory / "form.pdf")
+    create_form(FormSettings.from_file(str(settings_file)), "f", result)
+    return result
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+
+from core import batch
+from core.batch import FAILURE_INVALID, BatchRunner, Job
+
+from conftest import EXAMPLES
+
+
+def test_invalid_entries_are_reported(checkbox_form, tmp_path):
+    jobs_file = io.StringIO(
+        f"""
+operation: fill
+form: {checkbox_form}
+field_values: {{a: x}}
+output: {tmp_path / "ok.pdf"}
+---
+operation: print
+output: {tmp_path / "bad.pdf"}
+---
+operation: fill
+form: {checkbox_form}
+field_values: {{a: y}}
+---
+- not a job
+"""
+    )
+    error_report = tmp_path / "errors.ndjson"
+
+    runner = BatchRunner(workers=1, error_report=str(error_report))
+    result = runner.run(Job.all_from_stream(jobs_file))
+
+    assert result.done == 1
+    assert result.failed == 3
+    assert os.path.exists(tmp_path / "ok.pdf")
+
+    failures = [json.loads(line) for line in error_report.read_text().splitlines()]
+    assert [failure["error"] for failure in failures] == [FAILURE_INVALID] * 3
+    assert "unknown batch operation 'print'" in failures[0]["message"]
+    assert "'output'" in failures[1]["message"]
+
+
+def test_yaml_error_is_reported():
+    jobs = list(Job.all_from_stream(io.StringIO("operation: fill\n---\n: [\n")))
+
+    assert len(jobs) == 2
+    assert jobs[1].error() is not None
+
+
+def test_attach_reuses_generated_form(tmp_path, monkeypatch):
+    import core.operations_gen
+
+    created = []
+    original = core.operations_gen.create_form
+
+    def counting_create_form(*args, **kwargs):
+        created.append(args[1])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(core.operations_gen, "create_form", counting_create_form)
+    monkeypatch.setattr(batch, "_forms", batch.OrderedDict())
+
+    for i in range(3):
+        batch.run_job(
+            Job(
+                "attach",
+                {
+                    "settings": os.path.join(EXAMPLES, "form-settings.yaml"),
+                    "form_name": "my_awesome_form",
+                    "document": os.path.join(EXAMPLES, "document.pdf"),
+                    "output": str(tmp_path / f"{i}.pdf"),
+                },
+            )
+        )
+
+    assert created == ["my_awesome_form"]
+    assert all(os.path.exists(tmp_path / f"{i}.pdf") for i in range(3))
@@ -0,0 +1,16 @@
+from core.operations_extract import extract_values
+from core.operations_fill import fill_form
+
+
+def test_fill_extract_round_trip(checkbox_form, tmp_path):
+    result = str(tmp_path / "filled.pdf")
+    fill_form(checkbox_form, {"a": "Text", "c1": True, "c2": False}, result)
+
+    assert extract_values(result) == {"a": "Text", "c1": True, "c2": False}
+
+
+def test_unfilled_checkboxes(checkbox_form):
+    values = extract_values(checkbox_form)
+
+    assert values["c1"] is False
+    assert values["c2"] is False
@@ -0,0 +1,53 @@
+import pdfrw
+
+from core.operations_fill import fill_form
+
+
+def _widgets(pdf: pdfrw.PdfReader):
+    for page in pdf.pages:
+        for annotation in page.Annots or []:
+            if annotation.T is not None:
+                yield annotation.T.decode(), annotation
+
+
+def _has_appearance(widget: pdfrw.PdfDict) -> bool:
+    # Baseline fill clears /AP with an empty string for viewer-rendered fields
+    return isinstance(widget.AP, pdfrw.PdfDict) and widget.AP.N is not None
+
+
+def _fill(template, values, tmp_path) -> pdfrw.PdfReader:
+    output = str(tmp_path / "filled.pdf")
+    fill_form(template, values, output)
+    return pdfrw.PdfReader(output)
+
+
+def test_encodable_value_gets_appearance(example_form, tmp_path):
+    pdf = _fill(example_form, {"customer-name": "John"}, tmp_path)
+
+    widget = dict(_widgets(pdf))["customer-name"]
+    assert _has_appearance(widget)
+    assert "(John) Tj" in widget.AP.N.stream
+    assert pdf.Root.AcroForm.NeedAppearances is None
+
+
+def test_not_encodable_value_is_rendered_by_viewer(example_form, tmp_path):
+    pdf = _fill(example_form, {"customer-name": "Иван"}, tmp_path)
+
+    widget = dict(_widgets(pdf))["customer-name"]
+    assert widget.V.decode() == "Иван"
+    assert not _has_appearance(widget)
+    assert pdf.Root.AcroForm.NeedAppearances == pdfrw.PdfObject("true")
+
+
+def test_font_with_other_encoding_is_rendered_by_viewer(example_form, tmp_path):
+    template = pdfrw.PdfReader(example_form)
+    for font in template.Root.AcroForm.DR.Font.values():
+        font.Encoding = pdfrw.PdfName.WinAnsiEncoding
+    template_file = str(tmp_path / "winansi.pdf")
+    pdfrw.PdfWriter().write(template_file, template)
+
+    pdf = _fill(template_file, {"customer-name": "Jérôme"}, tmp_path)
+
+    widget = dict(_widgets(pdf))["customer-name"]
+    assert not _has_appearance(widget)
+    assert pdf.Root.AcroForm.NeedAppearances == pdfrw.PdfObject("true")
@@ -0,0 +1,10 @@
+from core import fill_cache
+from core.fill_cache import FillCache
+
+
+def test_key_depends_on_output_version(monkeypatch):
+    key = FillCache.key(b"%PDF", {"a": "x"}, auto_fit=False)
+    assert FillCache.key(b"%PDF", {"a": "x"}, auto_fit=False) == key
+
+    monkeypatch.setattr(fill_cache, "FILL_OUTPUT_VERSION", 1000)
+    assert FillCache.key(b"%PDF", {"a": "x"}, auto_fit=False) != key
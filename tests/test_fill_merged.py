@@ -0,0 +1,59 @@
+import pdfrw
+
+from core.operations_extract import extract_values
+from core.operations_fill import fill_form_merged
+
+
+def _hierarchical_form(checkbox_form: str, result: str) -> None:
+    # Field 'a' goes under the parent field 'group', a link is added to the page
+    pdf = pdfrw.PdfReader(checkbox_form)
+    acro_form = pdf.Root.AcroForm
+    field_a = next(field for field in acro_form.Fields if field.T == "(a)")
+
+    group = pdfrw.IndirectPdfDict(
+        T=pdfrw.PdfString.encode("group"), Kids=pdfrw.PdfArray([field_a])
+    )
+    field_a.Parent = group
+    acro_form.Fields = pdfrw.PdfArray(
+        [group] + [field for field in acro_form.Fields if field is not field_a]
+    )
+
+    page = pdf.pages[0]
+    page.Annots.append(
+        pdfrw.IndirectPdfDict(
+            Type=pdfrw.PdfName.Annot,
+            Subtype=pdfrw.PdfName.Link,
+            Rect=pdfrw.PdfArray([0, 0, 10, 10]),
+            P=page,
+        )
+    )
+    pdfrw.PdfWriter().write(result, pdf)
+
+
+def test_copies_keep_field_tree(checkbox_form, tmp_path):
+    template = str(tmp_path / "template.pdf")
+    result = str(tmp_path / "merged.pdf")
+    _hierarchical_form(checkbox_form, template)
+
+    fill_form_merged(template, [{"a": "x", "c1": True}, {"a": "y"}], result)
+
+    assert extract_values(result) == {
+        "1.group.a": "x",
+        "1.c1": True,
+        "1.c2": False,
+        "2.group.a": "y",
+        "2.c1": False,
+        "2.c2": False,
+    }
+
+    pdf = pdfrw.PdfReader(result)
+    for copy_field in pdf.Root.AcroForm.Fields:
+        for field in copy_field.Kids:
+            assert field.Parent is copy_field
+            for kid in field.Kids or []:
+                assert kid.Parent is field
+
+    for page in pdf.pages:
+        links = [a for a in page.Annots if a.Subtype == "/Link"]
+        assert len(links) == 1
+        assert links[0].P is page
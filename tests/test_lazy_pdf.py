@@ -0,0 +1,133 @@
+import zlib
+
+import pytest
+
+from core.exception import PdfReadError
+from core.lazy_pdf import LazyPdf, Name, Ref, Stream
+
+CATALOG = b"<< /Type /Catalog /AcroForm 2 0 R >>"
+ACRO_FORM = b"<< /Fields [3 0 R] >>"
+
+
+def _objects(data: bytearray, objects: dict) -> dict:
+    offsets = {}
+    for num, body in objects.items():
+        offsets[num] = len(data)
+        data += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    return offsets
+
+
+def _xref_table(data: bytearray, offsets: dict, trailer: bytes) -> None:
+    start = len(data)
+    data += b"xref\n"
+    for num, offset in sorted(offsets.items()):
+        if offset is None:
+            data += b"%d 1\n0000000000 00001 f\r\n" % num
+        else:
+            data += b"%d 1\n%010d 00000 n\r\n" % (num, offset)
+    data += b"trailer\n%s\nstartxref\n%d\n%%%%EOF\n" % (trailer, start)
+
+
+def _table_pdf(objects: dict) -> bytearray:
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = _objects(data, objects)
+    _xref_table(data, offsets, b"<< /Size %d /Root 1 0 R >>" % (max(objects) + 1))
+    return data
+
+
+def _stream(dictionary: bytes, data: bytes) -> bytes:
+    return b"<< %s /Length %d >>\nstream\n%s\nendstream" % (
+        dictionary,
+        len(data),
+        data,
+    )
+
+
+def _png_up(rows: list) -> bytes:
+    # PNG 'Up' predictor: each byte is stored as difference with the byte above
+    result = b""
+    previous = bytes(len(rows[0]))
+    for row in rows:
+        result += b"\x02" + bytes((a - b) % 256 for a, b in zip(row, previous))
+        previous = row
+    return result
+
+
+def test_xref_table():
+    pdf = LazyPdf(
+        bytes(_table_pdf({1: CATALOG, 2: ACRO_FORM, 3: b"<< /T (a) /V (x) >>"}))
+    )
+
+    root = pdf.resolve(pdf.trailer["Root"])
+    assert root["Type"] == Name("Catalog")
+    assert pdf.resolve(root["AcroForm"])["Fields"] == [Ref(3, 0)]
+    assert pdf.get(3) == {"T": b"a", "V": b"x"}
+
+
+def test_xref_and_object_streams():
+    objects = [(2, ACRO_FORM), (3, b"<< /T (a) /V (\\(x\\)) >>")]
+    pairs = []
+    body = b""
+    for num, obj in objects:
+        pairs.append(b"%d %d" % (num, len(body)))
+        body += obj + b" "
+    header = b" ".join(pairs) + b" "
+    object_stream = _stream(
+        b"/Type /ObjStm /N 2 /First %d /Filter /FlateDecode" % len(header),
+        zlib.compress(header + body),
+    )
+
+    data = bytearray(b"%PDF-1.5\n")
+    offsets = _objects(data, {1: CATALOG, 4: object_stream})
+    xref_offset = len(data)
+    entries = [
+        (0, 0, 0),
+        (1, offsets[1], 0),
+        (2, 4, 0),
+        (2, 4, 1),
+        (1, offsets[4], 0),
+        (1, xref_offset, 0),
+    ]
+    rows = [
+        bytes([kind]) + field.to_bytes(2, "big") + bytes([index])
+        for kind, field, index in entries
+    ]
+    xref_stream = _stream(
+        b"/Type /XRef /Size 6 /W [1 2 1] /Root 1 0 R /Filter /FlateDecode"
+        b" /DecodeParms << /Predictor 12 /Columns 4 >>",
+        zlib.compress(_png_up(rows)),
+    )
+    data += b"5 0 obj\n%s\nendobj\nstartxref\n%d\n%%%%EOF\n" % (
+        xref_stream,
+        xref_offset,
+    )
+
+    pdf = LazyPdf(bytes(data))
+
+    root = pdf.resolve(pdf.trailer["Root"])
+    assert pdf.resolve(root["AcroForm"])["Fields"] == [Ref(3, 0)]
+    assert pdf.get(3) == {"T": b"a", "V": b"(x)"}
+    assert isinstance(pdf.get(4), Stream)
+
+
+def test_incremental_update():
+    data = _table_pdf(
+        {1: CATALOG, 2: ACRO_FORM, 3: b"<< /T (a) /V (old) >>", 4: b"(removed)"}
+    )
+    prev = data.rindex(b"startxref")
+    prev = int(data[prev + len(b"startxref") :].split()[0])
+
+    offsets = _objects(data, {3: b"<< /T (a) /V (new) >>"})
+    offsets[4] = None
+    _xref_table(data, offsets, b"<< /Size 5 /Root 1 0 R /Prev %d >>" % prev)
+
+    pdf = LazyPdf(bytes(data))
+
+    assert pdf.get(3)["V"] == b"new"
+    assert pdf.get(4) is None
+    assert pdf.resolve(pdf.trailer["Root"])["Type"] == Name("Catalog")
+
+
+def test_broken_xref():
+    with pytest.raises(PdfReadError):
+        LazyPdf(b"%PDF-1.4\nstartxref\n12345\n%%EOF\n")
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core import operations_async
+from core.operations_async import FormRunner, fill_form_async
+
+
+def test_default_runner_in_several_loops(checkbox_form, monkeypatch):
+    monkeypatch.setattr(operations_async, "_default_runner", None)
+    operations_async.configure(max_concurrency=1)
+
+    async def fill_two():
+        # Concurrent calls make them wait on the semaphore
+        return await asyncio.gather(
+            fill_form_async(checkbox_form, {"a": "1"}),
+            fill_form_async(checkbox_form, {"a": "2"}),
+        )
+
+    for _ in range(2):
+        assert all(result.startswith(b"%PDF") for result in asyncio.run(fill_two()))
+
+
+def test_cancelled_job_keeps_slot(checkbox_form):
+    runner = FormRunner(ThreadPoolExecutor(2), max_concurrency=1)
+    job_done = threading.Event()
+
+    async def blocked():
+        async with runner._slot() as run:
+            await run(job_done.wait)
+
+    async def main():
+        task = asyncio.create_task(blocked())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+        fill = asyncio.create_task(runner.fill_form(checkbox_form, {"a": "x"}))
+        await asyncio.sleep(0.2)
+        # The cancelled job is still running in the executor
+        assert not fill.done()
+
+        job_done.set()
+        return await fill
+
+    assert asyncio.run(main()).startswith(b"%PDF")